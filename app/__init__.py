@@ -1,12 +1,53 @@
-from flask import render_template
-from .initialize import app, estimator, song_names, song_cosines
+from flask import Flask, jsonify, render_template, request
+from musipy.pool import PoolBusy, PoolTimeout
+from .api import api as api_blueprint
+from .initialize import WARM_UP_PROFILE, get_resources, warm_up
 from .views import main as main_blueprint
 
-# Register the blueprint
-app.register_blueprint(main_blueprint)
+
+def create_app(config_object="app.config.Config", resources=None):
+    """Build the Flask app around already loaded resources, or warm up new ones
+
+    Run under gunicorn with --preload (see gunicorn.conf.py) so this runs once
+    in the master and every worker forks with the data already loaded.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.extensions['musipy'] = resources if resources is not None else warm_up()
+
+    # Register the blueprint
+    app.register_blueprint(main_blueprint)
+    app.register_blueprint(api_blueprint)
+    app.register_error_handler(404, page_not_found)
+    app.register_error_handler(PoolBusy, overloaded)
+    app.register_error_handler(PoolTimeout, overloaded)
+    app.before_request(refresh_data)
+
+    # Serve each page once so routing, forms and templates are initialised
+    # here rather than on every worker's first request
+    client = app.test_client()
+    for path in ('/', '/recommend/'):
+        client.get(path)
+    client.post('/api/v1/personality', json=WARM_UP_PROFILE)
+    return app
+
 
 # Handle Bad Requests
-@app.errorhandler(404)
 def page_not_found(e):
     """Page Not Found"""
     return render_template('404.html'), 404
+
+
+# Pick up users ingested into the store (python -m musipy.ingest) without a restart
+def refresh_data():
+    """Swap in newly ingested data, checked every MUSIPY_REFRESH_INTERVAL seconds"""
+    get_resources().refresh()
+
+
+# Handle a full compute pool (503, retry shortly) or a scoring timeout (504)
+def overloaded(e):
+    """Server Busy"""
+    status = 503 if isinstance(e, PoolBusy) else 504
+    message = "Too many requests in progress, try again shortly." if status == 503 else "Request timed out."
+    body = jsonify(error=message) if request.path.startswith('/api/') else message
+    return body, status, {'Retry-After': '1'} if status == 503 else {}
@@ -0,0 +1,161 @@
+import math
+
+from flask import Blueprint, current_app, jsonify, request
+from musipy import TRAIT_COLUMNS
+from musipy.aggregate import DEFAULT_RULE, RULES
+from .initialize import get_resources
+
+# JSON endpoints next to the HTML views; no templates are rendered
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class BadRequest(ValueError):
+    """Request body the API cannot serve"""
+
+
+@api.errorhandler(BadRequest)
+def bad_request(e):
+    return jsonify(error=str(e)), 400
+
+
+def _body():
+    body = request.get_json(silent=True)
+    if body is None:
+        raise BadRequest("Expected a JSON body.")
+    return body
+
+
+def _count(body, name, default, limit=50):
+    value = body.get(name, default) if isinstance(body, dict) else default
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= limit:
+        raise BadRequest(f"'{name}' must be an integer from 1 to {limit}.")
+    return value
+
+
+def _batch(items, name):
+    if not items:
+        raise BadRequest(f"Expected at least one {name}.")
+    if len(items) > current_app.config.get('API_MAX_BATCH', 1000):
+        raise BadRequest(f"At most {current_app.config.get('API_MAX_BATCH', 1000)} {name}s per request.")
+    return items
+
+
+def _song(catalog, song_id, score):
+    return {'title': str(catalog.titles[song_id]), 'artist': str(catalog.artists[song_id]),
+            'genre': str(catalog.genres[song_id]), 'score': round(float(score), 4)}
+
+
+def _profiles(body):
+    """One profile, a list of them, or {"profiles": [...]} as rows of floats"""
+    if isinstance(body, dict):
+        body = body['profiles'] if 'profiles' in body else [body]
+    if not isinstance(body, list):
+        raise BadRequest("Expected a profile, a list of profiles or {\"profiles\": [...]}.")
+    rows = []
+    for profile in _batch(body, 'profile'):
+        try:
+            if isinstance(profile, dict):
+                profile = [profile[trait] for trait in TRAIT_COLUMNS]
+            # JSON numbers only: no strings, booleans, NaN or Infinity
+            if len(profile) != len(TRAIT_COLUMNS) or not all(
+                    isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in profile):
+                raise ValueError
+            row = [float(value) for value in profile]
+        except (KeyError, TypeError, ValueError, OverflowError):
+            raise BadRequest(f"Each profile needs numeric {', '.join(TRAIT_COLUMNS)} values.")
+        # Cosine distance needs a direction: the squared length must be finite and non-zero
+        squared = sum(value * value for value in row)
+        if not 0 < squared < math.inf:
+            raise BadRequest("Each profile needs a non-zero length that does not overflow.")
+        rows.append(row)
+    return rows
+
+
+def _seed_lists(body):
+    """One list of titles, a list of them, or {"songs": ...} with either"""
+    if isinstance(body, dict):
+        body = body.get('songs')
+    if isinstance(body, list) and body and all(isinstance(title, str) for title in body):
+        body = [body]
+    if not isinstance(body, list) or not all(
+            isinstance(seeds, list) and seeds and all(isinstance(title, str) for title in seeds)
+            for seeds in body):
+        raise BadRequest("Expected a list of song titles, a list of such lists or {\"songs\": [...]}.")
+    return _batch(body, 'song list')
+
+
+def _dislike_lists(body, n_lists):
+    """{"disliked": ...}: one list of titles for every song list, or one list per song list"""
+    disliked = body.get('disliked', []) if isinstance(body, dict) else []
+    if isinstance(disliked, list) and all(isinstance(title, str) for title in disliked):
+        return [disliked] * n_lists
+    if not isinstance(disliked, list) or len(disliked) != n_lists or not all(
+            isinstance(titles, list) and all(isinstance(title, str) for title in titles) for titles in disliked):
+        raise BadRequest("'disliked' must be a list of song titles or one such list per song list.")
+    return disliked
+
+
+@api.route('/personality', methods=('POST',))
+def personality():
+    """Songs liked by the users nearest to each posted Big Five profile
+
+    "rule" picks how the nearest users' ratings rank the songs, as on the
+    web form (see musipy.aggregate.rank_songs):
+
+        "picked"  (default) each user's first 3 songs rated 5 or more,
+                  nearest user first, as the form lists them
+        "mean"    every song by the users' mean rating, best first
+    """
+    body = _body()
+    rows = _profiles(body)
+    n_users = _count(body, 'n_users', 5, limit=100)
+    n_songs = _count(body, 'n_songs', 10)
+    rule = body.get('rule', DEFAULT_RULE) if isinstance(body, dict) else DEFAULT_RULE
+    if rule not in RULES:
+        raise BadRequest(f"'rule' must be one of {', '.join(RULES)}.")
+
+    # Repeated profiles come from the cache; the rest are scored in one batch
+    engine = get_resources()
+    catalog, userids = engine.catalog, engine.dataset.userids
+    results = [{
+        'nearest_users': [{'userid': str(userid, 'ascii'), 'distance': round(float(distance), 6)}
+                          for userid, distance in zip(userids[result.user_indices], result.user_distances)],
+        'songs': [_song(catalog, song_id, score)
+                  for song_id, score in zip(result.song_indices, result.song_scores)],
+    } for result in engine.recommend_profiles(rows, n_users, n_songs=n_songs, rule=rule)]
+    return jsonify(dataset_version=engine.version, results=results)
+
+
+@api.route('/similar', methods=('POST',))
+def similar():
+    """Songs most similar to each posted list of song titles, taken as a whole
+
+    A song's score is its mean cosine similarity to the seeds in the list,
+    less half its mean similarity to the optional "disliked" titles; seeds
+    and disliked songs are left out. Titles match whatever their case and
+    spacing.
+    """
+    body = _body()
+    seed_lists = _seed_lists(body)
+    dislike_lists = _dislike_lists(body, len(seed_lists))
+    n_songs = _count(body, 'n_songs', 10)
+
+    engine = get_resources()
+    catalog = engine.catalog
+    results = []
+    for seeds, disliked in zip(seed_lists, dislike_lists):
+        ids, unknown = catalog.resolve(seeds)
+        disliked_ids, unknown_disliked = catalog.resolve(disliked)
+        similar = engine.similar_songs(ids, n_songs, disliked_ids) if len(ids) else ()
+        results.append({
+            'seeds': [title for title in seeds if title not in unknown],
+            'unknown': unknown + unknown_disliked,
+            'songs': [_song(catalog, song_id, score) for song_id, score in similar],
+        })
+    return jsonify(results=results)
+
+
+@api.route('/stats')
+def stats():
+    """Result cache and compute pool counters of the worker serving the request"""
+    return jsonify(get_resources().stats())
@@ -3,6 +3,8 @@ class Config:
     WTF_CSRF_ENABLED = True
     DEBUG = True
     SECRET_KEY = 'you-will-never-guess'
+    # Most profiles or song lists accepted in one /api/v1 request
+    API_MAX_BATCH = 1000
 
 ## Old one below ##
 # WTF_CSRF_ENABLED = True
@@ -1,23 +1,14 @@
-import joblib
+import os
 import pandas as pd
-import sklearn
-from sklearn import model_selection, neighbors
 from sklearn.neighbors import KNeighborsRegressor
-from sklearn.metrics import mean_squared_error
-from scipy.spatial import distance as ds
-import numpy as np
-import statsmodels as sms
-import scipy.stats as stats
-import os
+from musipy.knn import MODEL_PATH, KNNModel
+from musipy.paths import DATA_DIR
 
-big5music = pd.read_csv('/Users/jenniferwang/musipy_by_jennwang/data/big5_music_fixed.csv')
+big5music = pd.read_csv(os.path.join(DATA_DIR, 'big5_music_fixed.csv'))
 big5music
 
-
-def get_distances(row, new_row):
-    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
-    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
-    return ds.cosine(u, v)
+# Neighbours at serving time are found by musipy.engine; this script only
+# fits and saves the KNN model
 
 
 # Define X and y
@@ -38,5 +29,6 @@ knn.fit(X, y)
 
 knn.score(X, y)
 
-# save as pickle!
-joblib.dump(knn, 'knn.pkl')
+# Save the arrays the app needs in the compact model format rather than a
+# pickle, which only loads under the scikit-learn version that wrote it
+KNNModel.from_estimator(knn, feature_columns, target_columns).save(MODEL_PATH)
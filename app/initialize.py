@@ -1,41 +1,30 @@
-import os
-import pandas as pd
-import joblib
-from flask import Flask
+from flask import current_app
+from musipy.engine import WARM_UP_PROFILE, Engine
 
-app = Flask(__name__)
-app.config.from_object("app.config.Config")
+# The data, indexes, result cache and compute pool live in musipy.engine,
+# shared with the Streamlit apps. It is configured from the environment:
+#
+#   MUSIPY_CACHE_URL     memory:// is per worker, sqlite:///path is shared by all of them
+#   MUSIPY_CACHE_SIZE, MUSIPY_CACHE_TTL
+#   MUSIPY_POOL_THREADS  scoring threads (default: one per CPU, 0 to score inline)
+#   MUSIPY_POOL_QUEUE    jobs allowed to wait before requests get a 503
+#   MUSIPY_POOL_TIMEOUT  seconds before a 504
+#   MUSIPY_USER_INDEX    brute, kdtree, ivf[:<n_probe>] or the precomputed
+#                        table lookup grid[:refine] (see musipy.user_index and musipy.grid)
+#   MUSIPY_REFRESH_INTERVAL  seconds between checks for users added by python -m
+#                        musipy.ingest (5; 0 checks on every request, -1 never)
 
-# Define the base directory
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
-# Define file paths
-MODEL_PATH = os.path.join(BASE_DIR, '../models/knn.pkl')
-SONG_NAMES_PATH = os.path.join(BASE_DIR, '../data/songs_names.csv')
-SONG_COSINES_PATH = os.path.join(BASE_DIR, '../data/song_cosines.csv')
+def load_resources():
+    """Load the indexes and memory-map the dataset"""
+    return Engine.from_env().load()
 
-# Unpickle the model
-try:
-    estimator = joblib.load(MODEL_PATH)
-    print("Model loaded successfully.")
-except FileNotFoundError:
-    estimator = None
-    print("Model file not found.")
-except ModuleNotFoundError as e:
-    estimator = None
-    print(f"Module not found error: {e}")
 
-# Load CSV files
-try:
-    song_names = pd.read_csv(SONG_NAMES_PATH, encoding='utf-8')
-    print("Songs names CSV file loaded successfully.")
-except FileNotFoundError:
-    song_names = None
-    print("Songs names CSV file not found.")
+def warm_up():
+    """Load everything and run one query so the first request starts hot"""
+    return Engine.from_env().warm_up(WARM_UP_PROFILE)
 
-try:
-    song_cosines = pd.read_csv(SONG_COSINES_PATH)
-    print("Song cosines CSV file loaded successfully.")
-except FileNotFoundError:
-    song_cosines = None
-    print("Song cosines CSV file not found.")
+
+def get_resources():
+    """Engine of the app handling the current request"""
+    return current_app.extensions['musipy']
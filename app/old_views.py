@@ -1,10 +1,7 @@
 from flask import Blueprint, render_template, request
 from flask_wtf import FlaskForm
 from wtforms import DecimalField, SubmitField
-import pandas as pd
-import numpy as np
-from scipy.spatial import distance as ds
-from .initialize import app, estimator, song_names, song_cosines
+from .initialize import get_resources
 
 # Define blueprint
 main = Blueprint('main', __name__)
@@ -18,13 +15,6 @@ class PredictForm(FlaskForm):
     neuroticism = DecimalField('Neuroticism:', places=2)
     submit = SubmitField('Submit')
 
-big5music = Blueprint('big5music', __name__)
-
-def get_distances(row, new_row):
-    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
-    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
-    return ds.cosine(u,v)
-
 # @app.route('/', methods=('GET', 'POST'))
 @main.route('/', methods=('GET', 'POST'))
 def index():
@@ -38,8 +28,6 @@ def index():
         print(submitted_data)
 
         # Extract only the relevant feature values
-        # features = [
-
         new_row = {
             'ope': float(submitted_data['openness']),
             'con': float(submitted_data['conscientiousness']),
@@ -48,49 +36,10 @@ def index():
             'neu': float(submitted_data['neuroticism'])
         }
 
-
-        # new_row = [submitted_data['openness'],
-        #     submitted_data['conscientiousness'],
-        #     submitted_data['extraversion'],
-        #     submitted_data['agreeableness'],
-        #     submitted_data['neuroticism']
-        # ]
-
-        ## Convert Decimal to float
-        # new_row = [float(f) for f in new_row]
-        # get_distances(submitted_data, new_row)
-       # features = [float(f) for f in features]
-
-        # Create array from values
+        # The nearest users come from the shared engine (musipy.engine),
+        # which replaced the per-row get_distances() apply
         try:
-            big5music['distance'] = big5music.apply(get_distances, args=(new_row,), axis=1)
-            big5music_sorted = big5music.sort_values('distance')
-
-            # song_returns = big5music_sorted[['Title', 'Artist', 'Genre', 'distance']].head(5).values.tolist()
-            # print(song_returns)
-            # # content_songs = estimator.predict(np.array([features]))
-            # song_recs = song_names.copy()
-            # # song_recs['Rating'] = content_songs
-            # song_recs = song_recs.sort_values('Rating', ascending=False)
-            # song_returns = [tuple(x) for x in song_recs[["Title", "Artist", "Genre"]].values][0:5]
-            # print(song_returns)
-
-
-            # Ensure the DataFrame contains the columns 'Title', 'Artist', 'Genre' #
-            if 'Title' in big5music.columns and 'Artist' in big5music.columns and 'Genre' in big5music.columns:
-                song_returns = big5music_sorted[['Title', 'Artist', 'Genre', 'distance']].head(5).values.tolist()
-                print(song_returns)
-            else:
-                print("The DataFrame does not contain the required columns.")
-            # if estimator is not None:
-            #     # content_songs = estimator.predict(np.array([features]))
-            #     song_recs = song_names.copy()
-            #     # song_recs['Rating'] = content_songs
-            #     song_recs = song_recs.sort_values('Rating', ascending=False)
-            #     song_returns = [tuple(x) for x in song_recs[["Title", "Artist", "Genre"]].values][0:5]
-            #     print(song_returns)
-            # else:
-            #     print("Estimator is not loaded properly.")
+            nearest = get_resources().nearest_users(new_row, 5)
         except Exception as e:
             print(f"Error in calculating distance: {e}")
 
@@ -110,22 +59,15 @@ def recommender():
         scores = scores.strip(';').split(';')
 
         try:
-            a1 = song_cosines[selected_songs]
-
-            recs_index = []
-            recs_title = []
-            recs_artist = []
-            recs_genre = []
-
-            for i in a1.columns:
-                sorted_a1 = sorted(enumerate(a1[i]), key=lambda x: x[1], reverse=True)
-                song_rec_index = [tup[0] for tup in sorted_a1[1:6]]
-                recs_index.extend(song_rec_index)
-                recs_title.append(song_names.Title.values[recs_index])
-                recs_artist.append(song_names.Artist.values[recs_index])
-                recs_genre.append(song_names.Genre.values[recs_index])
-
-            newone = list(zip(recs_title[1], recs_artist[1], recs_genre[1]))
+            engine = get_resources()
+            catalog = engine.catalog
+
+            # Rank every song against the liked songs together, less the
+            # shown songs left without a thumbs-up, as one top list
+            liked, _ = catalog.resolve(selected_songs)
+            disliked, _ = catalog.resolve([title for title in all_songs if title not in selected_songs])
+            similar = engine.similar_songs(liked, disliked=disliked) if len(liked) else ()
+            newone = engine.song_rows([song_id for song_id, _ in similar])
             print(newone)
 
             return render_template("recommend.html", song_returns=all_songs, newone=newone, scores=scores)
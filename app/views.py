@@ -1,19 +1,13 @@
 from flask import Blueprint, render_template, request
 from flask_wtf import FlaskForm
 from wtforms import DecimalField, SubmitField
-import pandas as pd
-import numpy as np
-from scipy.spatial import distance as ds
-from .initialize import app, estimator, song_names, song_cosines
+from musipy.cache import profile_key
+from musipy.pool import PoolBusy, PoolTimeout
+from .initialize import get_resources
 
 # Define a blueprint
 main = Blueprint('main', __name__)
 
-# ig5music = pd.read_pickle('/Users/jenniferwang/musipy_by_jennwang/models/knn.pkl')
-import os
-BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-big5music = pd.read_csv(os.path.join(BASE_DIR, 'data', 'final.csv'))
-
 class PredictForm(FlaskForm):
     """Fields for Predict"""
     openness = DecimalField('Openness:', places=2)
@@ -23,11 +17,6 @@ class PredictForm(FlaskForm):
     neuroticism = DecimalField('Neuroticism:', places=2)
     submit = SubmitField('Submit')
 
-def get_distances(row, new_row):
-    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
-    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
-    return ds.cosine(u, v)
-
 @main.route('/', methods=('GET', 'POST'))
 def index():
     """Index page"""
@@ -48,18 +37,17 @@ def index():
             'neu': float(submitted_data['neuroticism'])
         }
 
-        # Calculate the cosine distances and add them to the DataFrame
+        # Find the nearest users, reusing the answer for a repeated profile
         try:
-            big5music['distance'] = big5music.apply(get_distances, args=(new_row,), axis=1)
-            big5music_sorted = big5music.sort_values('distance')
-
-            # Ensure the DataFrame contains the columns 'Title', 'Artist', 'Genre'
-            # if ('Title' in big5music.columns):  #and 'Artist' in big5music.columns and 'Genre' in big5music.columns):
-            #     song_returns = big5music_sorted[['Title']].head(5).values.tolist()
-            #         #, 'Artist', 'Genre', 'distance']].head(5).values.tolist()
-            #     print(song_returns)
-            # else:
-            #     print("The DataFrame does not contain the required columns.")
+            engine = get_resources()
+            key = profile_key(new_row, scale_invariant=engine.user_index.scale_invariant)
+            nearest = engine.cache.get_or_compute(
+                ('nearest', engine.user_index.spec, key, 5),
+                lambda: engine.pool.run(engine.nearest_users, new_row, 5),
+                version=engine.version)
+        except (PoolBusy, PoolTimeout):
+            # Answered with a 503/504 by the app's error handlers
+            raise
         except Exception as e:
             print(f"Error in calculating distances: {e}")
 
@@ -78,22 +66,15 @@ def recommender():
         scores = scores.strip(';').split(';')
 
         try:
-            a1 = song_cosines[selected_songs]
-
-            recs_index = []
-            recs_title = []
-            recs_artist = []
-            recs_genre = []
-
-            for i in a1.columns:
-                sorted_a1 = sorted(enumerate(a1[i]), key=lambda x: x[1], reverse=True)
-                song_rec_index = [tup[0] for tup in sorted_a1[1:6]]
-                recs_index.extend(song_rec_index)
-                recs_title.append(song_names.Title.values[recs_index])
-                recs_artist.append(song_names.Artist.values[recs_index])
-                recs_genre.append(song_names.Genre.values[recs_index])
-
-            newone = list(zip(recs_title[1], recs_artist[1], recs_genre[1]))
+            engine = get_resources()
+            catalog = engine.catalog
+
+            # Rank every song against the liked songs together, less the
+            # shown songs left without a thumbs-up, as one top list
+            liked, _ = catalog.resolve(selected_songs)
+            disliked, _ = catalog.resolve([title for title in all_songs if title not in selected_songs])
+            similar = engine.similar_songs(liked, disliked=disliked) if len(liked) else ()
+            newone = engine.song_rows([song_id for song_id, _ in similar])
             print(newone)
 
             return render_template("recommend.html", song_returns=all_songs, newone=newone, scores=scores)
@@ -0,0 +1,65 @@
+"""Per-user iterrows() loop vs the vectorized song aggregation
+
+For random profiles, ranks the songs of the n nearest users both ways
+(rating threshold 5, 3 songs per user, 10 songs), checks the two lists
+agree, and times each for several neighbour counts.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_aggregate --neighbors 5 50 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from musipy.aggregate import similarity_weights, top_rated_songs
+from musipy.dataset import load_dataset
+from musipy.store import load_users
+from musipy.user_index import build_index
+
+
+def loop_songs(top_users, song_columns, threshold=5, per_user=3, n_songs=10):
+    # The Streamlit recommenders' original per-user loop
+    recommendations = []
+    for _, user in top_users.iterrows():
+        user_songs = user[song_columns]
+        recommendations.extend(user_songs[user_songs >= threshold].index.tolist()[:per_user])
+    return list(dict.fromkeys(recommendations))[:n_songs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--neighbors', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    big5music = load_users()
+    song_columns = list(dataset.song_titles)
+    index = build_index('brute', dataset.unit_traits)
+    queries = np.round(np.random.default_rng(0).uniform(1, 5, size=(args.queries, 5)), 2)
+
+    print(f"{args.queries} profiles, {len(song_columns)} songs")
+    print(f"{'neighbors':>9} {'loop':>12} {'vectorized':>12} {'speedup':>8} {'agree':>6}")
+    for n in args.neighbors:
+        indices, distances = index.search(queries, n)
+        loop_time = vector_time = 0.0
+        agree = 0
+        for row in range(len(queries)):
+            top_users = big5music.iloc[indices[row]]
+            start = time.perf_counter()
+            expected = loop_songs(top_users, song_columns)
+            loop_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            ranking = top_rated_songs(dataset.ratings[indices[row]], similarity_weights(distances[row]))
+            vector_time += time.perf_counter() - start
+            agree += [song_columns[i] for i in ranking.indices] == expected
+        loop_us, vector_us = 1e6 * loop_time / len(queries), 1e6 * vector_time / len(queries)
+        print(f"{n:>9} {loop_us:>10.0f}us {vector_us:>10.0f}us {loop_us / vector_us:>7.0f}x "
+              f"{agree / len(queries):>6.0%}")
+
+
+if __name__ == '__main__':
+    main()
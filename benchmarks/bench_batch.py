@@ -0,0 +1,44 @@
+"""Compare scoring profiles one at a time with musipy.batch chunks
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch --profiles 20000 --chunk-sizes 16 64 256 1024
+"""
+import argparse
+import time
+
+import numpy as np
+
+from musipy import top_k
+from musipy.batch import recommend_many
+from musipy.dataset import load_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', type=int, default=20000)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[16, 64, 256, 1024])
+    parser.add_argument('--loop-profiles', type=int, default=500, help='profiles timed on the one-at-a-time path')
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    matrix = dataset.personality_matrix
+    profiles = np.round(np.random.default_rng(0).uniform(1, 5, size=(args.profiles, 5)), 2)
+
+    # One distance vector and one top_k per profile, as the web views do
+    start = time.perf_counter()
+    looped = [top_k(matrix.distances(p), 5) for p in profiles[:args.loop_profiles]]
+    loop_rate = args.loop_profiles / (time.perf_counter() - start)
+    print(f"{'one at a time':>16} {loop_rate:>12,.0f} profiles/s")
+
+    for chunk_size in args.chunk_sizes:
+        start = time.perf_counter()
+        result = recommend_many(dataset, profiles, chunk_size=chunk_size)
+        rate = args.profiles / (time.perf_counter() - start)
+        same = np.array_equal(result.user_indices[:args.loop_profiles], np.array(looped))
+        print(f"{f'chunks of {chunk_size}':>16} {rate:>12,.0f} profiles/s "
+              f"({rate / loop_rate:.1f}x, same neighbors: {same})")
+
+
+if __name__ == '__main__':
+    main()
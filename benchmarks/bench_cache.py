@@ -0,0 +1,71 @@
+"""Cache hit rate across forked workers: per-worker memory vs shared SQLite
+
+Forks --workers processes from one preloaded app, as gunicorn --preload
+does, and has each post the same stream of repeated profiles to
+/api/v1/personality in a different order. With memory:// every worker
+computes every profile once itself; with a shared sqlite:/// file each
+profile is computed about once in total.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cache --workers 4 --profiles 500 --requests 2000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def worker(app, profiles, order, results):
+    client = app.test_client()
+    start = time.perf_counter()
+    for i in order:
+        client.post('/api/v1/personality', json={'profiles': [profiles[i]]})
+    elapsed = time.perf_counter() - start
+    stats = client.get('/api/v1/stats').get_json()['cache']
+    results.put((stats['hits'], stats['misses'], elapsed))
+
+
+def run(url, args):
+    # Each run builds its engine with its own cache URL
+    os.environ['MUSIPY_CACHE_URL'] = url
+    from app import create_app
+    from app.initialize import warm_up
+
+    application = create_app(resources=warm_up())
+    rng = np.random.default_rng(0)
+    profiles = np.round(rng.uniform(1, 5, size=(args.profiles, 5)), 2).tolist()
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(application, profiles,
+                                                  rng.integers(0, args.profiles, args.requests), results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    usage = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    hits, misses = sum(u[0] for u in usage), sum(u[1] for u in usage)
+    rate = args.workers * args.requests / max(u[2] for u in usage)
+    print(f"{url:<40} hits {hits:>6}  misses {misses:>6}  hit rate {hits / (hits + misses):>6.1%}  "
+          f"{rate:>8,.0f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--profiles', type=int, default=500, help='distinct profiles in the request stream')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per worker')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for url in ['memory://', f"sqlite:///{os.path.join(tmp, 'cache.db')}"]:
+            run(url, args)
+
+
+if __name__ == '__main__':
+    main()
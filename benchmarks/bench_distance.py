@@ -0,0 +1,76 @@
+"""Compare the per-row DataFrame.apply distance path with PersonalityMatrix
+
+Run from the repository root:
+
+    python -m benchmarks.bench_distance --queries 20
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import distance as ds
+
+from musipy import PersonalityMatrix
+
+BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+FINAL_PATH = os.path.join(BASE_DIR, 'data', 'final.csv')
+
+
+def get_distances(row, new_row):
+    # Copy of the original per-row scorer in app/views.py
+    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
+    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
+    return ds.cosine(u, v)
+
+
+def random_profiles(n, seed=0):
+    """Profiles on the 1-5 scale with the 2 decimal places the form allows"""
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(1, 5, size=(n, 5)), 2)
+    return [dict(zip(['ope', 'con', 'ext', 'agr', 'neu'], row)) for row in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--top', type=int, default=5, help='ranking prefix compared for agreement')
+    args = parser.parse_args()
+
+    big5music = pd.read_csv(FINAL_PATH)
+    profiles = random_profiles(args.queries)
+
+    start = time.perf_counter()
+    matrix = PersonalityMatrix.from_frame(big5music)
+    build_time = time.perf_counter() - start
+
+    apply_times, engine_times = [], []
+    max_error, same_top = 0.0, 0
+    for profile in profiles:
+        start = time.perf_counter()
+        expected = big5music.apply(get_distances, args=(profile,), axis=1).to_numpy()
+        apply_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        actual = matrix.distances(profile)
+        engine_times.append(time.perf_counter() - start)
+
+        max_error = max(max_error, float(np.abs(expected - actual).max()))
+        # Compare which users are nearest; exact ties may legitimately swap
+        expected_top = np.argsort(expected, kind='stable')[:args.top]
+        actual_top = matrix.ranking(profile)[:args.top]
+        same_top += np.allclose(expected[expected_top], expected[actual_top], atol=1e-6)
+
+    apply_ms = 1000 * np.median(apply_times)
+    engine_ms = 1000 * np.median(engine_times)
+    print(f"rows: {len(matrix)}  queries: {len(profiles)}  matrix build: {1000 * build_time:.2f} ms")
+    print(f"DataFrame.apply:   {apply_ms:9.3f} ms/query (median)")
+    print(f"PersonalityMatrix: {engine_ms:9.3f} ms/query (median)")
+    print(f"speed-up: {apply_ms / engine_ms:.0f}x")
+    print(f"max |distance error|: {max_error:.2e}")
+    print(f"top-{args.top} rankings equivalent: {same_top}/{len(profiles)}")
+
+
+if __name__ == '__main__':
+    main()
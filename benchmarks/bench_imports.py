@@ -0,0 +1,72 @@
+"""Import-time report for the serving path (python -X importtime)
+
+Imports each target in a fresh interpreter with -X importtime, prints the
+slowest top-level packages and the total, and with --check exits non-zero
+if a heavy package that serving should not need gets imported (or the
+total exceeds --budget-ms). tests/test_imports.py runs the same package
+check under pytest; for the timings:
+
+    python -m benchmarks.bench_imports --check
+
+Targets: 'app' is the bare package import; 'run_production' also builds
+the app and runs its warm-up, i.e. everything a gunicorn master does.
+"""
+import argparse
+import subprocess
+import sys
+
+from musipy.paths import BASE_DIR
+
+TARGETS = ['app', 'run_production']
+
+# Only the offline tools (store, training, benchmarks) should need these
+HEAVY_PACKAGES = ['pandas', 'scipy', 'sklearn', 'joblib', 'statsmodels', 'matplotlib', 'streamlit']
+
+
+def import_times(target):
+    """(module, self_us, cumulative_us) for every module the import loads"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+                            cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times.append((module.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('targets', nargs='*', default=TARGETS)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--check', action='store_true', help='fail if a heavy package is imported')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail if a target takes longer')
+    args = parser.parse_args()
+
+    failures = []
+    for target in args.targets:
+        times = import_times(target)
+        total_ms = sum(self_us for _, self_us, _ in times) / 1000
+        packages = {}
+        for module, self_us, _ in times:
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+
+        print(f"import {target}: {len(times)} modules, {total_ms:.1f} ms")
+        for package, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<24} {us / 1000:8.1f} ms")
+
+        heavy = [package for package in HEAVY_PACKAGES if package in packages]
+        if heavy:
+            failures.append(f"import {target} loads {', '.join(heavy)}")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            failures.append(f"import {target} took {total_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+
+    if args.check and failures:
+        print('\n'.join(['FAILED:'] + failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Nearest users for a profile moved one slider at a time: full search vs incremental
+
+Simulates a session dragging sliders in 0.1 steps, one trait per rerun,
+and times the brute-force index against IncrementalDistances over the
+real users or --users synthetic ones. Reports how often the two disagree
+on the nearest users (only users tied to float32 rounding can swap).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_incremental --users 1000000 --steps 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_user_index import synthetic_users
+from musipy.dataset import load_dataset
+from musipy.incremental import IncrementalDistances
+from musipy.user_index import BruteForceIndex
+
+
+def slider_walk(steps, seed=0):
+    rng = np.random.default_rng(seed)
+    profile = np.round(rng.uniform(1, 5, size=5), 1)
+    walk = []
+    for _ in range(steps):
+        trait = rng.integers(5)
+        profile[trait] = np.clip(profile[trait] + rng.choice([-0.1, 0.1]), 1, 5).round(1)
+        walk.append(profile.copy())
+    return walk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=0, help='synthetic users (default: the real ones)')
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    unit = synthetic_users(np.asarray(dataset.traits), args.users) if args.users else dataset.unit_traits
+    walk = slider_walk(args.steps)
+
+    index = BruteForceIndex(unit)
+    start = time.perf_counter()
+    exact = [index.search(profile, args.k)[0][0] for profile in walk]
+    full = (time.perf_counter() - start) / len(walk)
+
+    distances = IncrementalDistances(np.asfortranarray(unit))
+    start = time.perf_counter()
+    found = [distances.nearest(profile, args.k)[0] for profile in walk]
+    incremental = (time.perf_counter() - start) / len(walk)
+
+    start = time.perf_counter()
+    for _ in range(len(walk)):
+        distances.nearest(walk[-1], args.k)
+    skipped = (time.perf_counter() - start) / len(walk)
+
+    differ = sum(not np.array_equal(a, b) for a, b in zip(exact, found))
+    print(f"{len(unit)} users, {len(walk)} slider steps, k={args.k}")
+    print(f"  full search      {1e3 * full:8.2f} ms/step")
+    print(f"  incremental      {1e3 * incremental:8.2f} ms/step  {distances.counts}")
+    print(f"  unchanged input  {1e3 * skipped:8.2f} ms/step")
+    print(f"  steps whose nearest users differ: {differ}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Ingest throughput, and how long serving takes to see the new users
+
+Copies the data files to a temporary directory, loads an Engine on the copy
+and keeps querying it from a reader thread (calling refresh() as the Flask
+app does before every request) while batches of new users are ingested
+with musipy.ingest. For every batch it reports the users ingested per
+second, and the staleness: the time from the commit until the engine
+serves the new dataset. The real data/ directory is left untouched.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ingest --batches 20 --batch-size 1000 --refresh-interval 0.5
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from musipy.distance import TRAIT_COLUMNS
+from musipy.engine import Engine
+from musipy.ingest import ingest_users
+from musipy.paths import DATA_DIR
+from musipy.store import load_users
+
+DATA_FILES = ['final.csv', 'song_cosines.csv', 'songs_names.csv']
+
+
+def copy_data(target):
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(DATA_DIR, name), target)
+    shutil.copytree(os.path.join(DATA_DIR, 'store'), os.path.join(target, 'store'))
+
+
+def new_users(users, batch, size, rng):
+    """Existing users' ratings under new userids, with their traits moved a little"""
+    frame = users.iloc[rng.integers(len(users), size=size)].copy()
+    frame['userid'] = [f'ingest{batch:04d}x{i:06d}' for i in range(size)]
+    traits = frame[TRAIT_COLUMNS].to_numpy() + rng.normal(0, 0.1, size=(size, len(TRAIT_COLUMNS)))
+    frame[TRAIT_COLUMNS] = np.clip(traits, 1, 5).round(2)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--refresh-interval', type=float, default=0.5, help='seconds between schema checks')
+    parser.add_argument('--user-index', default='brute')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as data_dir:
+        copy_data(data_dir)
+        users = load_users(os.path.join(data_dir, 'final.csv'))
+        engine = Engine(data_dir, args.user_index, refresh_interval=args.refresh_interval).load()
+
+        stop = threading.Event()
+        served = {'queries': 0, 'errors': 0}
+
+        def reader():
+            profiles = rng.uniform(1, 5, size=(256, 5))
+            while not stop.is_set():
+                try:
+                    engine.refresh()
+                    engine.rank_songs(*engine.nearest_users(profiles[served['queries'] % 256], 5))
+                    served['queries'] += 1
+                except Exception as e:
+                    served['errors'] += 1
+                    print(f"query failed: {e!r}")
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+
+        rates, staleness, steps = [], [], {}
+        for batch in range(args.batches):
+            frame = new_users(users, batch, args.batch_size, rng)
+            start = time.perf_counter()
+            result = ingest_users(frame, data_dir)
+            rates.append(result.rows / (time.perf_counter() - start))
+            for step, seconds in result.timings.items():
+                steps.setdefault(step, []).append(seconds)
+            while engine.stats()['data']['generation'] != result.generation:
+                time.sleep(0.001)
+            staleness.append(engine.refreshes['staleness'])
+        stop.set()
+        thread.join()
+
+        last = frame.iloc[-1]
+        found = engine.dataset.userids[engine.nearest_users(last[TRAIT_COLUMNS].to_numpy(dtype=float), 1)[0][0]]
+
+    print(f"{args.batches} batches of {args.batch_size} users, {engine.user_index.spec} index, "
+          f"refresh every {args.refresh_interval} s; {len(engine.dataset)} users at the end")
+    print(f"  ingest throughput  median {np.median(rates):,.0f} users/s, min {min(rates):,.0f}")
+    print("  per ingest         " + ", ".join(f"{step} {1000 * np.median(seconds):.1f} ms"
+                                            for step, seconds in steps.items()))
+    print(f"  staleness          median {1000 * np.median(staleness):.0f} ms, max {1000 * max(staleness):.0f} ms")
+    print(f"  reader             {served['queries']} queries, {served['errors']} errors")
+    print(f"  last ingested user nearest to its own traits: {found.decode() == last['userid']}")
+
+
+if __name__ == '__main__':
+    main()
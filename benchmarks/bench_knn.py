@@ -0,0 +1,85 @@
+"""Compare the compact KNN model with the pickled KNeighborsRegressor
+
+Fits the model create_model_pickle.py fits, converts it, and reports load
+time, predict latency and the largest difference between predictions on
+random profiles and on training rows (which exercise exact matches).
+
+Queries with several training rows tied at the 2000th-neighbor distance
+are reported apart: which of the tied rows make the cut is arbitrary in
+scikit-learn too, so those predictions can legitimately differ.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_knn --queries 200
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsRegressor
+
+from musipy.knn import KNNModel, TARGET_COLUMNS
+from musipy.paths import DATA_DIR
+from musipy.distance import TRAIT_COLUMNS
+
+
+def timed(func, repeat=5):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, 1000 * min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    big5music = pd.read_csv(os.path.join(DATA_DIR, 'big5_music_fixed.csv'))
+    knn = KNeighborsRegressor(n_neighbors=2000, weights='distance')
+    knn.fit(big5music[TRAIT_COLUMNS], big5music[TARGET_COLUMNS])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path, model_path = os.path.join(tmp, 'knn.pkl'), os.path.join(tmp, 'knn.bin')
+        joblib.dump(knn, pickle_path)
+        KNNModel.from_estimator(knn).save(model_path)
+        print(f"file size: pickle {os.path.getsize(pickle_path) / 1e6:.2f} MB, "
+              f"compact {os.path.getsize(model_path) / 1e6:.2f} MB")
+
+        _, pickle_ms = timed(lambda: joblib.load(pickle_path))
+        model, model_ms = timed(lambda: KNNModel.load(model_path))
+        print(f"load: joblib {pickle_ms:.2f} ms, compact {model_ms:.2f} ms")
+
+        rng = np.random.default_rng(0)
+        profiles = np.round(rng.uniform(1, 5, size=(args.queries, 5)), 2)
+        training_rows = big5music[TRAIT_COLUMNS].to_numpy()[rng.choice(len(big5music), 20, replace=False)]
+
+        for name, queries in [('random profiles', profiles), ('training rows', training_rows)]:
+            frame = pd.DataFrame(queries, columns=TRAIT_COLUMNS)
+            expected, sklearn_ms = timed(lambda: knn.predict(frame), repeat=1)
+            actual, model_ms = timed(lambda: model.predict(queries), repeat=1)
+            distances, _ = model.kneighbors(queries, model.n_neighbors + 1)
+            tied = distances[:, -1] == distances[:, -2]
+            errors = np.abs(expected - actual).max(axis=1)
+            error = errors[~tied].max(initial=0)
+            status = 'ok' if error <= args.tolerance else 'MISMATCH'
+            print(f"{name}: max |difference| {error:.2e} ({status}); "
+                  f"sklearn {sklearn_ms / len(queries):.2f} ms/query, compact {model_ms / len(queries):.2f} ms/query")
+            if tied.any():
+                print(f"  {tied.sum()} queries with ties at the k-th neighbor: max |difference| {errors[tied].max():.2e}")
+
+        one = profiles[:1]
+        _, sklearn_ms = timed(lambda: knn.predict(pd.DataFrame(one, columns=TRAIT_COLUMNS)))
+        _, model_ms = timed(lambda: model.predict(one))
+        print(f"single query: sklearn {sklearn_ms:.2f} ms, compact {model_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
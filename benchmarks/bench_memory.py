@@ -0,0 +1,104 @@
+"""Resident memory per worker: private pandas copies vs the shared mmap dataset
+
+Forks --workers processes the way gunicorn does without --preload, has each
+load the data and serve one query, then reports RSS/PSS/USS per worker
+while they are all alive. PSS is what to size containers by.
+
+Run from the repository root (after python -m musipy.store):
+
+    python -m benchmarks.bench_memory --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+from musipy.memory import memory_usage
+from musipy.paths import DATA_DIR, MODELS_DIR
+
+PROFILE = {'ope': 4.1, 'con': 3.2, 'ext': 2.5, 'agr': 3.9, 'neu': 2.2}
+
+
+def load_pandas(model_path):
+    # What every worker did before: its own DataFrames and unpickled model
+    import joblib
+    import pandas as pd
+    from musipy import PersonalityMatrix
+    big5music = pd.read_csv(os.path.join(DATA_DIR, 'final.csv'))
+    song_cosines = pd.read_csv(os.path.join(DATA_DIR, 'song_cosines.csv'))
+    estimator = joblib.load(model_path) if model_path else None
+    big5music['distance'] = PersonalityMatrix.from_frame(big5music).distances(PROFILE)
+    return big5music, song_cosines, estimator
+
+
+def load_mmap(model_path):
+    import joblib
+    from musipy.dataset import load_dataset
+    dataset = load_dataset(DATA_DIR, mmap_mode='r')
+    estimator = joblib.load(model_path, mmap_mode='r') if model_path else None
+    dataset.personality_matrix.distances(PROFILE)
+    # Touch every page the recommenders read
+    dataset.ratings.sum(), dataset.cosines.sum()
+    if estimator is not None:
+        estimator._fit_X.sum(), estimator._y.sum()
+    return dataset, estimator
+
+
+def worker(mode, model_path, barrier, results):
+    data = (load_pandas if mode == 'pandas' else load_mmap)(model_path)
+    barrier.wait()
+    results.put((os.getpid(), memory_usage()))
+    barrier.wait()
+    del data
+
+
+def fit_model(path):
+    """Fit the same KNN create_model_pickle.py fits, for hosts without models/knn.pkl"""
+    import joblib
+    import pandas as pd
+    from sklearn.neighbors import KNeighborsRegressor
+    big5music = pd.read_csv(os.path.join(DATA_DIR, 'big5_music_fixed.csv'))
+    knn = KNeighborsRegressor(n_neighbors=2000, weights='distance')
+    knn.fit(big5music[['ope', 'con', 'ext', 'agr', 'neu']], big5music[[f'q{i}' for i in range(1, 51)]])
+    joblib.dump(knn, path)
+    return path
+
+
+def run(mode, workers, model_path):
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(mode, model_path, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    usage = [results.get() for _ in processes]
+    barrier.wait()
+    for process in processes:
+        process.join()
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--model', default=os.path.join(MODELS_DIR, 'knn.pkl'))
+    parser.add_argument('--no-model', action='store_true', help='leave the KNN model out')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = None
+        if not args.no_model:
+            model_path = args.model if os.path.exists(args.model) else fit_model(os.path.join(tmp, 'knn.pkl'))
+
+        for mode in ['pandas', 'mmap']:
+            usage = run(mode, args.workers, model_path)
+            print(f"{mode}: {args.workers} workers")
+            for pid, stats in usage:
+                print(f"  pid {pid}: RSS {stats['rss']:7.1f}  PSS {stats['pss']:7.1f}  USS {stats['uss']:7.1f} MiB")
+            total = {name: sum(stats[name] for _, stats in usage) for name in ['rss', 'pss', 'uss']}
+            print(f"  total:     RSS {total['rss']:7.1f}  PSS {total['pss']:7.1f}  USS {total['uss']:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
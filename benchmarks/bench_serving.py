@@ -0,0 +1,115 @@
+"""Load test: sync gunicorn workers vs threaded workers with a bounded compute pool
+
+Starts gunicorn with gunicorn.conf.py in each mode and has --clients
+threads post to /api/v1/personality for --duration seconds. Most requests
+score one profile; a --heavy fraction score a --heavy-size batch, which is
+what holds a sync worker. Every profile is random, so the result cache
+never answers. Reports throughput, status codes and the latency of the
+small requests.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_serving --clients 32 --duration 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from musipy.paths import BASE_DIR
+
+from .bench_startup import free_port
+
+MODES = {
+    'sync 4x1': {'GUNICORN_WORKERS': '4', 'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_THREADS': '1'},
+    'gthread 2x16': {'GUNICORN_WORKERS': '2', 'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '16'},
+}
+
+
+def start_server(env, workers, timeout=120):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+                               'run_production:application'],
+                              cwd=BASE_DIR, env=dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', **env),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    lines = []
+    threading.Thread(target=lambda: lines.extend(server.stderr), daemon=True).start()
+    start = time.perf_counter()
+    while len([l for l in lines if 'booted in' in l]) < workers:
+        if server.poll() is not None or time.perf_counter() - start > timeout:
+            server.terminate()
+            raise RuntimeError('gunicorn did not start:\n' + ''.join(lines))
+        time.sleep(0.05)
+    return server, port
+
+
+def client(url, args, seed, deadline, records):
+    rng = np.random.default_rng(seed)
+    while time.perf_counter() < deadline:
+        heavy = rng.random() < args.heavy
+        profiles = np.round(rng.uniform(1, 5, size=(args.heavy_size if heavy else 1, 5)), 2).tolist()
+        request = urllib.request.Request(url, json.dumps({'profiles': profiles}).encode(),
+                                         {'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0
+        records.append((heavy, status, time.perf_counter() - start))
+
+
+def run(name, env, args):
+    server, port = start_server(dict(env, MUSIPY_POOL_QUEUE=str(args.queue),
+                                     MUSIPY_POOL_TIMEOUT=str(args.timeout)), int(env['GUNICORN_WORKERS']))
+    records = []
+    try:
+        deadline = time.perf_counter() + args.duration
+        clients = [threading.Thread(target=client, args=(f'http://127.0.0.1:{port}/api/v1/personality',
+                                                         args, seed, deadline, records))
+                   for seed in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    statuses = {}
+    for _, status, _ in records:
+        statuses[status] = statuses.get(status, 0) + 1
+    small = np.array([latency for heavy, status, latency in records if not heavy and status == 200]) * 1000
+    p50, p95, p99 = np.percentile(small, [50, 95, 99]) if small.size else (np.nan,) * 3
+    print(f"{name:<14} {len(records) / args.duration:>8.1f} req/s  statuses {dict(sorted(statuses.items()))}")
+    print(f"{'':<14} small requests: p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--heavy', type=float, default=0.05, help='fraction of batch requests')
+    parser.add_argument('--heavy-size', type=int, default=1000, help='profiles per batch request')
+    parser.add_argument('--queue', type=int, default=32, help='MUSIPY_POOL_QUEUE for the threaded mode')
+    parser.add_argument('--timeout', type=float, default=30, help='MUSIPY_POOL_TIMEOUT in seconds')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.heavy:.0%} batches of {args.heavy_size}")
+    for name in args.modes:
+        run(name, MODES[name], args)
+
+
+if __name__ == '__main__':
+    main()
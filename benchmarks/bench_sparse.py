@@ -0,0 +1,105 @@
+"""Memory and latency of sparse ratings at catalog scale (synthetic data)
+
+Builds --users x --songs synthetic ratings with about --per-user ratings
+per user, song popularity falling off as a power law and 1 in 10 ratings
+an explicit 0, as SparseRatings. It never builds the dense matrix, only
+reports its size, then times on the sparse one:
+
+    gather + aggregate   a profile's nearest users' rows -> top rated songs
+    knn predict          KNNModel over sparse targets (NaN where unrated)
+    item-item            SongCosines Gram matrix, then 10 neighbours per song
+
+Run from the repository root (the defaults need about 2 GB of memory):
+
+    python -m benchmarks.bench_sparse --users 1000000 --songs 10000
+"""
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from musipy.aggregate import similarity_weights, top_rated_songs
+from musipy.distance import normalize_rows
+from musipy.knn import KNNModel
+from musipy.similarity import SongCosines
+from musipy.sparse import SparseRatings
+from musipy.user_index import BruteForceIndex
+
+
+def synthetic_ratings(n_users, n_songs, per_user, rng):
+    counts = rng.poisson(per_user, size=n_users) + 1
+    popularity = 1 / (np.arange(n_songs) + 10.0) ** 0.8
+    users = np.repeat(np.arange(n_users, dtype=np.int64), counts)
+    songs = rng.choice(n_songs, size=len(users), p=popularity / popularity.sum())
+    # Drop repeated (user, song) draws
+    cells = np.unique(users * n_songs + songs)
+    values = rng.integers(0, 10, size=len(cells), dtype=np.uint8)
+    return SparseRatings.from_triples(cells // n_songs, cells % n_songs, values, (n_users, n_songs))
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--songs', type=int, default=10000)
+    parser.add_argument('--per-user', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--knn-neighbors', type=int, default=2000)
+    parser.add_argument('--skip-item-item', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    ratings = synthetic_ratings(args.users, args.songs, args.per_user, rng)
+    built = time.perf_counter() - start
+    csc_seconds, _ = timed(lambda: ratings.csc, 1)
+    csc_bytes = ratings.csc.data.nbytes + ratings.csc.indices.nbytes + ratings.csc.indptr.nbytes
+    print(f"{args.users} users x {args.songs} songs, {ratings.nnz} ratings (density {ratings.density:.2%}), "
+          f"built in {built:.1f} s")
+    print(f"  dense uint8 would take {args.users * args.songs / 2 ** 20:10,.0f} MiB")
+    print(f"  CSR                    {ratings.nbytes / 2 ** 20:10,.0f} MiB")
+    print(f"  CSC                    {csc_bytes / 2 ** 20:10,.0f} MiB  (built in {csc_seconds:.2f} s)")
+
+    traits = rng.uniform(1, 5, size=(args.users, 5))
+    index = BruteForceIndex(normalize_rows(traits))
+    profiles = rng.uniform(1, 5, size=(args.queries, 5))
+    for k in (5, 50, 500):
+        search, found = timed(lambda: index.search(profiles, k), 1)
+        indices, distances = found
+
+        def aggregate():
+            for row in range(len(indices)):
+                top_rated_songs(ratings[indices[row]], similarity_weights(distances[row]),
+                                rated=ratings.rated(indices[row]))
+
+        seconds, _ = timed(aggregate, 1)
+        print(f"  k={k:<4} search {1e3 * search / len(profiles):7.2f} ms/query, "
+              f"gather + aggregate {1e3 * seconds / len(profiles):7.2f} ms/query")
+
+    model = KNNModel(traits, ratings, n_neighbors=args.knn_neighbors, weights='distance')
+    seconds, predictions = timed(lambda: model.predict(profiles), 1)
+    print(f"  knn predict (k={args.knn_neighbors}) {1e3 * seconds / len(profiles):7.2f} ms/query, "
+          f"{np.isnan(predictions).mean():.1%} of songs unrated by every neighbour")
+
+    if not args.skip_item_item:
+        accumulator = SongCosines.empty(args.songs)
+        seconds, _ = timed(lambda: accumulator.add(ratings), 1)
+        neighbors_seconds, _ = timed(lambda: accumulator.neighbors(10), 1)
+        print(f"  item-item Gram {seconds:.1f} s ({accumulator.gram.nbytes / 2 ** 20:,.0f} MiB), "
+              f"10 neighbours per song {neighbors_seconds:.1f} s")
+        batch = SparseRatings.from_dense(ratings[np.arange(1000)])
+        seconds, _ = timed(lambda: accumulator.add(batch), 1)
+        print(f"  item-item update with 1000 new users {1e3 * seconds:.0f} ms")
+
+    print(f"  peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10:,.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Worker boot time and cold first-request latency, with and without --preload
+
+Starts gunicorn with gunicorn.conf.py, waits for every worker to report it
+booted, then sends one request to each worker at once and reads the boot
+and first-request timings the config's hooks log.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from musipy.paths import BASE_DIR
+
+FIRST_REQUEST = '/recommend/?selected_songs=Safety;MATRIX;&all_songs=Safety;MATRIX;&scores=3;3;3;3;3;'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run(preload, workers, timeout=120):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0',
+               GUNICORN_WORKERS=str(workers), GUNICORN_BIND=f'127.0.0.1:{port}')
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+                               'run_production:application'],
+                              cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    lines = []
+    reader = threading.Thread(target=lambda: lines.extend(server.stderr), daemon=True)
+    reader.start()
+    try:
+        while len([l for l in lines if 'booted in' in l]) < workers:
+            if server.poll() is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError('gunicorn did not start:\n' + ''.join(lines))
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+
+        threads = [threading.Thread(target=urllib.request.urlopen, args=(f'http://127.0.0.1:{port}{FIRST_REQUEST}',))
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait()
+        reader.join(timeout=1)
+
+    boots = [float(m) for m in re.findall(r'booted in ([\d.]+) ms', ''.join(lines))]
+    firsts = [float(m) for m in re.findall(r'first request \S+ took ([\d.]+) ms', ''.join(lines))]
+    return ready, boots, firsts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    for preload in [False, True]:
+        ready, boots, firsts = run(preload, args.workers)
+        print(f"preload={preload}: all {args.workers} workers ready after {1000 * ready:.0f} ms")
+        print(f"  worker boot:   max {max(boots):8.1f} ms  mean {sum(boots) / len(boots):8.1f} ms")
+        if firsts:
+            print(f"  first request: max {max(firsts):8.1f} ms  mean {sum(firsts) / len(firsts):8.1f} ms "
+                  f"({len(firsts)} workers served one)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compare a full sort with top_k partial selection for the nearest users
+
+Run from the repository root:
+
+    python -m benchmarks.bench_topk --rows 21302 200000 2000000 --k 5
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from musipy import top_k
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return 1000 * min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[21302, 200000, 2000000])
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'sort_values':>12} {'argsort':>10} {'top_k':>10}")
+    for rows in args.rows:
+        # Rounded distances so ties occur, as they do for duplicate profiles
+        distances = np.round(rng.random(rows, dtype=np.float32), 4)
+        frame = pd.DataFrame({'distance': distances})
+
+        expected = frame.sort_values('distance', kind='stable').head(args.k).index.to_numpy()
+        assert (top_k(distances, args.k) == expected).all()
+
+        sort_ms = best_of(lambda: frame.sort_values('distance', kind='stable').head(args.k))
+        argsort_ms = best_of(lambda: np.argsort(distances, kind='stable')[:args.k])
+        top_k_ms = best_of(lambda: top_k(distances, args.k))
+        print(f"{rows:>10} {sort_ms:>10.3f}ms {argsort_ms:>8.3f}ms {top_k_ms:>8.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
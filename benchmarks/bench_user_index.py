@@ -0,0 +1,63 @@
+"""Recall vs latency of the nearest-user indexes against exact brute force
+
+Builds every index over the real users, or over --users synthetic ones
+drawn around them (real profiles plus noise, on the 1-5 scale) to stand
+in for a larger survey. It then times --queries random 2-decimal profiles
+one at a time and as a batch, and scores recall@k against the exact
+cosine ranking.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_user_index --users 1000000 --indexes brute kdtree ivf:4 ivf:8 ivf:16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from musipy import normalize_rows
+from musipy.dataset import load_dataset
+from musipy.user_index import build_index
+
+
+def synthetic_users(traits, n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = traits[rng.integers(0, len(traits), n)] + rng.normal(0, 0.25, size=(n, traits.shape[1]))
+    return normalize_rows(np.clip(rows, 1, 5).round(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=0, help='synthetic users (default: the real ones)')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--indexes', nargs='+', default=['brute', 'kdtree', 'ivf:1', 'ivf:4', 'ivf:8', 'ivf:16'])
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    unit = synthetic_users(np.asarray(dataset.traits), args.users) if args.users else dataset.unit_traits
+    queries = np.round(np.random.default_rng(1).uniform(1, 5, size=(args.queries, 5)), 2)
+    exact, _ = build_index('brute', unit).search(queries, args.k)
+
+    print(f"{len(unit)} users, {args.queries} queries, k={args.k}")
+    print(f"{'index':<10} {'build':>10} {'single':>12} {'batch':>12} {'recall':>8}")
+    for spec in args.indexes:
+        start = time.perf_counter()
+        index = build_index(spec, unit)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries[:200]:
+            index.search(query, args.k)
+        single = (time.perf_counter() - start) / len(queries[:200])
+
+        start = time.perf_counter()
+        found, _ = index.search(queries, args.k)
+        batch = (time.perf_counter() - start) / len(queries)
+
+        recall = np.mean([len(np.intersect1d(a, b)) / args.k for a, b in zip(found, exact)])
+        print(f"{spec:<10} {build:>9.2f}s {1e6 * single:>10.0f}us {1e6 * batch:>10.0f}us {recall:>8.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Concurrent requests must get the same answers as serial ones
+
+Builds the app once, computes reference answers for --profiles profiles
+one at a time, then replays them from --threads threads at once: through
+Engine.nearest_users directly, and through /api/v1/personality (which also
+exercises the result cache). Any answer that differs from its reference,
+or any change to the shared dataset arrays, fails the run.
+tests/test_concurrency.py runs the same checks at a small scale under
+pytest.
+
+Run from the repository root:
+
+    python -m benchmarks.stress_concurrency --threads 16 --profiles 400
+"""
+import argparse
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import create_app
+
+
+def checksum(dataset):
+    return [zlib.crc32(np.ascontiguousarray(values).tobytes())
+            for values in (dataset.traits, dataset.unit_traits, dataset.ratings)]
+
+
+def replay(name, threads, jobs, reference):
+    # Every thread waits at the barrier so the requests genuinely overlap
+    barrier = threading.Barrier(threads)
+
+    def run(chunk):
+        barrier.wait()
+        return [(i, job()) for i, job in chunk]
+
+    chunks = [list(enumerate(jobs))[t::threads] for t in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        answers = [answer for chunk in pool.map(run, chunks) for answer in chunk]
+    elapsed = time.perf_counter() - start
+    wrong = [i for i, answer in answers if answer != reference[i]]
+    print(f"{name:<24} {len(answers)} answers from {threads} threads in {elapsed:.2f} s, {len(wrong)} wrong")
+    return not wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--profiles', type=int, default=400)
+    args = parser.parse_args()
+
+    app = create_app()
+    engine = app.extensions['musipy']
+    dataset = engine.dataset
+    before = checksum(dataset)
+
+    rng = np.random.default_rng(0)
+    profiles = np.round(rng.uniform(1, 5, size=(args.profiles, 5)), 2).tolist()
+    # Each profile twice, so cache hits race with the misses that fill them
+    profiles = profiles + profiles
+
+    def nearest(profile):
+        return lambda: engine.nearest_users(profile, 5)[0].tolist()
+
+    def personality(profile):
+        client = app.test_client()
+        return lambda: client.post('/api/v1/personality', json={'profiles': [profile]}).get_json()['results']
+
+    ok = True
+    for name, make_job in [('Engine.nearest_users', nearest), ('/api/v1/personality', personality)]:
+        reference = [make_job(profile)() for profile in profiles]
+        engine.cache.clear()
+        ok &= replay(name, args.threads, [make_job(profile) for profile in profiles], reference)
+
+    unchanged = checksum(dataset) == before
+    try:
+        dataset.traits[0, 0] = 0
+        writable = True
+    except ValueError:
+        writable = False
+    print(f"shared arrays unchanged: {unchanged}, writable: {writable}")
+    sys.exit(0 if ok and unchanged and not writable else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Gunicorn settings for the production image
+
+preload_app makes the master import run_production, which calls
+app.create_app() and warms up (loads the data, builds the indexes) once.
+Workers are then plain forks that inherit all of it copy-on-write, so a
+worker boots in milliseconds and its first request is already hot.
+
+Set GUNICORN_PRELOAD=0 to get the old behaviour of every worker loading
+its own copy, e.g. to compare with benchmarks/bench_startup.py.
+
+By default workers are sync: each serves one request at a time, so one
+slow request holds a whole process. For the threaded mode, set
+GUNICORN_WORKER_CLASS=gthread and GUNICORN_THREADS, e.g. 2 workers x 16
+threads. Request threads then hand scoring to each worker's bounded
+compute pool (MUSIPY_POOL_THREADS / _QUEUE / _TIMEOUT, see
+musipy/engine.py), which answers 503 once its queue is full and 504 when
+a job overruns. Compare the modes with benchmarks/bench_serving.py.
+"""
+import gc
+import os
+import time
+
+from musipy.memory import format_usage, memory_usage
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:9000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded objects out of the cyclic collector, whose passes
+    # would otherwise write to them and un-share their pages in every worker
+    gc.freeze()
+    worker.fork_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    boot = time.perf_counter() - worker.fork_started
+    worker.log.info(f"Worker {worker.pid} booted in {1000 * boot:.1f} ms ({format_usage(memory_usage())})")
+
+
+def pre_request(worker, req):
+    worker.request_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    if not getattr(worker, 'first_request_logged', False):
+        worker.first_request_logged = True
+        latency = time.perf_counter() - worker.request_started
+        worker.log.info(f"Worker {worker.pid} first request {req.path} took {1000 * latency:.1f} ms")
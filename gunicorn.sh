@@ -20,5 +20,6 @@ test -d $RUNDIR || mkdir -p $RUNDIR
 exec gunicorn run:application -b 127.0.0.1:9000 \
   --name $NAME \
   --workers $NUM_WORKERS \
+  --preload \
   --log-level=debug \
   --bind=unix:$SOCKFILE
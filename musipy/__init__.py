@@ -0,0 +1,3 @@
+"""Recommendation engine shared by the Flask app and the Streamlit front-ends"""
+from .distance import TRAIT_COLUMNS, PersonalityMatrix, as_trait_vector, normalize_rows
+from .topk import top_k
@@ -0,0 +1,111 @@
+"""Songs recommended by a profile's nearest users, from their ratings
+
+Every function takes the neighbours' rating sub-matrix, nearest neighbour
+first: (k, songs) for one profile or (m, k, songs) for a batch. It works on
+the whole block at once, so 500 neighbours cost about what 5 do.
+
+A neighbour's rating counts when it is at least threshold, and only for the
+neighbour's first per_user such songs in column order. These are the rules
+the Streamlit recommenders applied one user at a time with iterrows().
+
+rank_songs() is the one entry point that serves a recommendation: rule
+'picked' is top_rated_songs() with the threshold and cap, as the web form
+has always ranked; rule 'mean' ranks every song by the neighbours' plain
+mean rating, as musipy.batch does by default.
+
+Sparse ratings (musipy.sparse) tell an unrated cell from a 0 rating. Pass
+their rated mask as rated= and unrated cells are never counted, and a
+song's mean only covers the neighbours who rated it.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .topk import top_k
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_PER_USER = 3
+DEFAULT_SONGS = 10
+RULES = ('picked', 'mean')
+DEFAULT_RULE = 'picked'
+
+SongRanking = namedtuple('SongRanking', 'indices scores')
+
+
+def selected_ratings(ratings, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER, rated=None):
+    """Mask of the ratings that count; None disables the threshold or the cap"""
+    ratings = np.asarray(ratings)
+    mask = np.ones(ratings.shape, dtype=bool) if threshold is None else ratings >= threshold
+    if rated is not None:
+        mask &= rated
+    if per_user is not None:
+        mask &= np.cumsum(mask, axis=-1) <= per_user
+    return mask
+
+
+def similarity_weights(distances):
+    """Neighbour weights from cosine distances: their cosine similarity, floored at 0"""
+    return np.clip(1 - np.asarray(distances, dtype=np.float64), 0, None)
+
+
+def song_scores(ratings, weights=None, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER, mask=None,
+                rated=None):
+    """Weighted mean of the counted ratings per song: sum(w * r * counted) / sum(w)
+
+    Uncounted ratings add 0, so with no threshold or cap and equal weights
+    this is the neighbours' mean rating. With a rated mask the sum of
+    weights is only over the neighbours who rated the song.
+    """
+    ratings = np.asarray(ratings)
+    if mask is None and (threshold is not None or per_user is not None or rated is not None):
+        mask = selected_ratings(ratings, threshold, per_user, rated)
+    if weights is None:
+        weights = np.ones(ratings.shape[:-1])
+    weights = np.asarray(weights, dtype=np.float64)
+    counted = ratings if mask is None else np.where(mask, ratings, 0)
+    totals = np.einsum('...k,...ks->...s', weights, counted.astype(np.float64))
+    if rated is None:
+        norms = weights.sum(axis=-1, keepdims=True)
+    else:
+        norms = np.einsum('...k,...ks->...s', weights, np.asarray(rated, dtype=np.float64))
+    return totals / np.where(norms == 0, 1, norms)
+
+
+def top_rated_songs(ratings, weights=None, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER,
+                    n_songs=DEFAULT_SONGS, order='first', rated=None):
+    """Up to n_songs song positions for one profile's (k, songs) ratings, with their scores
+
+    Only songs some neighbour's counted rating picked are returned. With
+    order='first' they come in the order the per-user loop listed them:
+    nearest neighbour first, then column order, repeats dropped. With
+    order='score' they are ranked by song_scores(), ties by column.
+    """
+    ratings = np.asarray(ratings)
+    mask = selected_ratings(ratings, threshold, per_user, rated)
+    scores = song_scores(ratings, weights, mask=mask, rated=rated)
+    picked = mask.any(axis=0)
+
+    if order == 'first':
+        # Key each song by the first (neighbour, column) that picked it
+        first = np.argmax(mask, axis=0)
+        keys = np.where(picked, first * ratings.shape[1] + np.arange(ratings.shape[1]), np.iinfo(np.int64).max)
+        indices = top_k(keys, min(n_songs, int(picked.sum())))
+    elif order == 'score':
+        indices = top_k(np.where(picked, scores, np.nan), min(n_songs, int(picked.sum())), largest=True)
+    else:
+        raise ValueError(f"order must be 'first' or 'score', not {order!r}")
+    return SongRanking(indices, scores[indices])
+
+
+def rank_songs(ratings, weights=None, rule=DEFAULT_RULE, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER,
+               n_songs=DEFAULT_SONGS, rated=None):
+    """Up to n_songs song positions for one profile's (k, songs) ratings under a ranking rule
+
+    'picked' is top_rated_songs() with weights, threshold and per_user;
+    'mean' ignores them and ranks all songs by the unweighted mean rating.
+    """
+    if rule == 'picked':
+        return top_rated_songs(ratings, weights, threshold, per_user, n_songs, rated=rated)
+    if rule == 'mean':
+        return top_rated_songs(ratings, None, None, None, n_songs, order='score', rated=rated)
+    raise ValueError(f"rule must be one of {', '.join(RULES)}, not {rule!r}")
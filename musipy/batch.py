@@ -0,0 +1,142 @@
+"""Score many Big Five profiles at once
+
+Each chunk of profiles is matched against every user with one
+matrix-matrix product, the nearest users are picked row by row with top_k,
+and each profile's songs are ranked by those users' mean rating, or by a
+musipy.aggregate score with a rating threshold, a per-user cap and
+similarity weights. Results
+are yielded chunk by chunk so inputs of any size stream through in
+bounded memory. Any musipy.user_index index can replace the brute-force
+user search.
+
+As a command-line tool it reads a CSV with ope, con, ext, agr and neu
+columns and writes one CSV row per profile:
+
+    python -m musipy.batch profiles.csv --output recommendations.csv
+"""
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import aggregate
+from .distance import TRAIT_COLUMNS
+from .topk import top_k
+from .user_index import DEFAULT_INDEX, BruteForceIndex, build_index
+
+# Rows [start, start + len) of the input; every array has one row per profile
+BatchResult = namedtuple('BatchResult', 'start user_indices user_distances song_indices song_scores')
+
+
+def as_profile_matrix(profiles):
+    """(n, 5) float array from an array, a list of dicts or a DataFrame"""
+    if hasattr(profiles, 'columns'):
+        return profiles[TRAIT_COLUMNS].to_numpy(dtype=np.float64)
+    if len(profiles) and hasattr(profiles[0], 'keys'):
+        return np.array([[float(p[trait]) for trait in TRAIT_COLUMNS] for p in profiles])
+    return np.asarray(profiles, dtype=np.float64).reshape(-1, len(TRAIT_COLUMNS))
+
+
+def recommend_batch(dataset, profiles, n_users=5, n_songs=10, chunk_size=64, start=0, index=None,
+                    threshold=None, per_user=None, weighted=False):
+    """Yield a BatchResult per chunk of profiles
+
+    song_scores is the mean rating the n_users nearest users gave each song,
+    over those of them who rated it.
+    With threshold or per_user only ratings musipy.aggregate counts add to
+    it, and weighted weighs each user by their cosine similarity.
+    Users are found with index (see musipy.user_index), by default brute
+    force, where chunk_size bounds the (chunk_size x users) block held at once.
+    """
+    profiles = as_profile_matrix(profiles)
+    if index is None:
+        index = BruteForceIndex(dataset.personality_matrix.unit, chunk_size)
+    for offset in range(0, len(profiles), chunk_size):
+        user_indices, user_distances = index.search(profiles[offset:offset + chunk_size], n_users)
+        weights = aggregate.similarity_weights(user_distances) if weighted else None
+        song_means = aggregate.song_scores(dataset.ratings[user_indices], weights, threshold, per_user,
+                                           rated=dataset.rated(user_indices))
+        song_indices = top_k(song_means, n_songs, largest=True)
+        song_scores = np.take_along_axis(song_means, song_indices, axis=1)
+        yield BatchResult(start + offset, user_indices, user_distances, song_indices, song_scores)
+
+
+def recommend_many(dataset, profiles, **kwargs):
+    """recommend_batch, concatenated into a single BatchResult"""
+    results = list(recommend_batch(dataset, profiles, **kwargs))
+    if not results:
+        return BatchResult(0, *(np.empty((0, 0)) for _ in range(4)))
+    return BatchResult(0, *(np.concatenate([getattr(r, field) for r in results])
+                            for field in BatchResult._fields[1:]))
+
+
+def write_csv(dataset, results, out, n_songs, ids=None, header=True):
+    """Stream BatchResults as CSV rows: id, nearest_users, song_1.., score_1..
+
+    ids[result.start + row] labels each row; the row position if ids is None.
+    Returns the number of profiles written.
+    """
+    import csv
+
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(['id', 'nearest_users'] + [f'song_{i}' for i in range(1, n_songs + 1)]
+                        + [f'score_{i}' for i in range(1, n_songs + 1)])
+    titles = np.asarray(dataset.song_titles)
+    userids = dataset.userids.astype(str)
+    count = 0
+    for result in results:
+        for row in range(len(result.song_indices)):
+            position = result.start + row
+            writer.writerow([position if ids is None else ids[position],
+                             ';'.join(userids[result.user_indices[row]])]
+                            + titles[result.song_indices[row]].tolist()
+                            + [f'{score:.4f}' for score in result.song_scores[row]])
+        count += len(result.song_indices)
+    return count
+
+
+def main():
+    import pandas as pd
+
+    from .dataset import load_dataset
+
+    parser = argparse.ArgumentParser(description='Recommend songs for a CSV of Big Five profiles.')
+    parser.add_argument('input', help="CSV with ope, con, ext, agr, neu columns ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="output CSV ('-' for stdout)")
+    parser.add_argument('--id-column', default='userid', help='input column copied to the id column, if present')
+    parser.add_argument('--users', type=int, default=5, help='nearest users per profile')
+    parser.add_argument('--songs', type=int, default=10, help='songs per profile')
+    parser.add_argument('--chunk-size', type=int, default=64, help='profiles per matrix product')
+    parser.add_argument('--index', default=DEFAULT_INDEX,
+                        help='user index: brute (exact), kdtree (brute up to float32 ties), ivf or ivf:<n_probe>')
+    parser.add_argument('--threshold', type=int, help='only count ratings of at least this')
+    parser.add_argument('--per-user', type=int, help="only count each user's first N counted songs")
+    parser.add_argument('--weighted', action='store_true', help='weigh users by cosine similarity')
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    index = build_index(args.index, dataset.unit_traits)
+    reader = pd.read_csv(sys.stdin if args.input == '-' else args.input, chunksize=args.chunk_size * 16)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+
+    began = time.perf_counter()
+    count = 0
+    try:
+        for frame in reader:
+            ids = frame[args.id_column].tolist() if args.id_column in frame else range(count, count + len(frame))
+            results = recommend_batch(dataset, frame, args.users, args.songs, args.chunk_size, index=index,
+                                      threshold=args.threshold, per_user=args.per_user, weighted=args.weighted)
+            count += write_csv(dataset, results, out, args.songs, ids, header=count == 0)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - began
+    print(f"Scored {count} profiles in {elapsed:.2f} s ({count / max(elapsed, 1e-9):,.0f} profiles/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Big Five Inventory (BFI-S) scoring for one respondent or a whole survey export
+
+BFI_QUESTIONS is the 15-item key the Streamlit tests ask from. Responses
+are on a 1-5 scale; reverse-keyed items are scored 6 - answer. A trait's
+score is the mean of its answered items, rounded to 2 decimals, or 3.0
+(neutral) when none of its items were answered. Missing answers (NaN,
+None, or outside 1-5) are left out of the mean rather than counted as 0.
+
+score_responses() scores an (n, 15) response matrix with one product
+against a (15, 5) item-to-trait loading matrix, so a million respondents
+take well under a second. Scores come out in the ope, con, ext, agr, neu
+order of final.csv. As a command-line tool it scores a CSV export with
+columns bfi1..bfi15:
+
+    python -m musipy.bfi responses.csv --output traits.csv
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from .distance import TRAIT_COLUMNS
+
+# Big Five Inventory (BFI-S) - 15 items
+BFI_QUESTIONS = {
+    0: {"text": "I see myself as someone who is reserved.", "trait": "extraversion", "reverse": True},
+    1: {"text": "I see myself as someone who is generally trusting.", "trait": "agreeableness", "reverse": False},
+    2: {"text": "I see myself as someone who tends to be lazy.", "trait": "conscientiousness", "reverse": True},
+    3: {"text": "I see myself as someone who is relaxed, handles stress well.", "trait": "neuroticism", "reverse": True},
+    4: {"text": "I see myself as someone who has few artistic interests.", "trait": "openness", "reverse": True},
+    5: {"text": "I see myself as someone who is outgoing, sociable.", "trait": "extraversion", "reverse": False},
+    6: {"text": "I see myself as someone who tends to find fault with others.", "trait": "agreeableness", "reverse": True},
+    7: {"text": "I see myself as someone who does a thorough job.", "trait": "conscientiousness", "reverse": False},
+    8: {"text": "I see myself as someone who gets nervous easily.", "trait": "neuroticism", "reverse": False},
+    9: {"text": "I see myself as someone who has an active imagination.", "trait": "openness", "reverse": False},
+    10: {"text": "I see myself as someone who is sometimes shy, inhibited.", "trait": "extraversion", "reverse": True},
+    11: {"text": "I see myself as someone who is helpful and unselfish with others.", "trait": "agreeableness", "reverse": False},
+    12: {"text": "I see myself as someone who can be somewhat careless.", "trait": "conscientiousness", "reverse": True},
+    13: {"text": "I see myself as someone who is calm, emotionally stable.", "trait": "neuroticism", "reverse": True},
+    14: {"text": "I see myself as someone who is curious about many different things.", "trait": "openness", "reverse": False}
+}
+
+# Trait names used by BFI_QUESTIONS, in TRAIT_COLUMNS order
+TRAIT_NAMES = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+ITEM_COLUMNS = [f'bfi{i + 1}' for i in range(len(BFI_QUESTIONS))]
+SCALE = (1, 5)
+NEUTRAL = 3.0
+
+
+def scoring_key(questions=BFI_QUESTIONS):
+    """(items, 5) loading matrix of 0/1 item-to-trait weights and the reverse-keyed item mask"""
+    items = sorted(questions)
+    loadings = np.zeros((len(items), len(TRAIT_NAMES)))
+    loadings[np.arange(len(items)), [TRAIT_NAMES.index(questions[i]['trait']) for i in items]] = 1
+    return loadings, np.array([questions[i]['reverse'] for i in items])
+
+
+def score_responses(responses, questions=BFI_QUESTIONS, decimals=2):
+    """(n, 5) trait scores, in TRAIT_COLUMNS order, for an (n, items) response matrix
+
+    Columns are the items in question order. NaN or out-of-range answers
+    count as missing.
+    """
+    loadings, reverse = scoring_key(questions)
+    responses = np.asarray(responses, dtype=np.float64).reshape(-1, len(loadings))
+    answered = (responses >= SCALE[0]) & (responses <= SCALE[1])
+    keyed = np.where(reverse, SCALE[0] + SCALE[1] - responses, responses)
+    sums = np.where(answered, keyed, 0) @ loadings
+    counts = answered @ loadings
+    scores = np.divide(sums, counts, out=np.full_like(sums, NEUTRAL), where=counts > 0)
+    return scores.round(decimals)
+
+
+def trait_scores(answers, questions=BFI_QUESTIONS):
+    """Scores of one respondent's {question id: answer} dict, keyed by trait name"""
+    positions = {question_id: i for i, question_id in enumerate(sorted(questions))}
+    row = np.full(len(questions), np.nan)
+    for question_id, answer in answers.items():
+        if answer is not None:
+            row[positions[question_id]] = answer
+    return dict(zip(TRAIT_NAMES, score_responses(row, questions)[0].tolist()))
+
+
+def score_frame(frame, item_columns=ITEM_COLUMNS, id_column='userid'):
+    """DataFrame with ope, con, ext, agr and neu columns for a frame of responses
+
+    Missing or non-numeric answers count as missing. The id column, if
+    present, is kept first, as in final.csv.
+    """
+    import pandas as pd
+
+    responses = frame[item_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    scored = pd.DataFrame(score_responses(responses), columns=TRAIT_COLUMNS, index=frame.index)
+    if id_column in frame:
+        scored.insert(0, id_column, frame[id_column])
+    return scored
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Score Big Five questionnaire responses.')
+    parser.add_argument('input', help="CSV with columns bfi1..bfi15 ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="output CSV ('-' for stdout)")
+    parser.add_argument('--id-column', default='userid', help='input column copied to the output, if present')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='respondents read at a time')
+    args = parser.parse_args()
+
+    reader = pd.read_csv(sys.stdin if args.input == '-' else args.input, chunksize=args.chunk_size)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    began = time.perf_counter()
+    count = 0
+    try:
+        for frame in reader:
+            score_frame(frame, id_column=args.id_column).to_csv(out, header=count == 0, index=False)
+            count += len(frame)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - began
+    print(f"Scored {count} respondents in {elapsed:.2f} s ({count / max(elapsed, 1e-9):,.0f} respondents/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
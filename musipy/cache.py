@@ -0,0 +1,215 @@
+"""Recommendation result caches: in-process LRU or shared SQLite file
+
+Profiles come from a form with 2 decimal places, so the same inputs recur.
+Cosine distance only depends on a profile's direction, and the distance
+code scores the float32 unit vector, so that vector is the cache key: any
+two profiles with the same key get identical results. The grid index
+(musipy.grid) picks its cell from the profile itself, so for it the key is
+the profile as given.
+
+Both backends bound the number of entries, can expire entries after a
+TTL, and namespace entries by dataset version. LRUCache lives in one
+process. SQLiteCache keeps entries in a file that every gunicorn worker
+(and Streamlit process) on the host reads and writes, so one worker's
+results serve the others. open_cache() picks a backend from a URL:
+
+    memory://                     in-process LRU
+    sqlite:///path/to/cache.db    shared SQLite file
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .distance import as_trait_vector, normalize_rows
+
+DEFAULT_MAXSIZE = 4096
+
+
+def profile_key(profile, decimals=None, scale_invariant=True):
+    """Cache key for a profile (dict or sequence): its float32 unit vector as bytes
+
+    With decimals, the profile is rounded first, as the form rounds input.
+    Without scale_invariant, for indexes whose answer depends on the
+    profile's size, the key is the float64 profile itself.
+    """
+    vector = as_trait_vector(profile)
+    if decimals is not None:
+        vector = vector.round(decimals)
+    return normalize_rows(vector).tobytes() if scale_invariant else vector.tobytes()
+
+
+class Cache:
+    """Mapping of results for one dataset version, bounded in size and age
+
+    Backends implement get(), put(), clear(), __len__ and _drop_version().
+    Keys are tuples of str, bytes and numbers; cached values are shared
+    between callers, so store immutable ones.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None, version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _expires(self):
+        return None if self.ttl is None else time.time() + self.ttl
+
+    def set_version(self, version):
+        """Switch to a dataset version, dropping entries of any other version"""
+        if version != self.version:
+            if self._drop_version(version):
+                self.invalidations += 1
+            self.version = version
+
+    def get_or_compute(self, key, compute, version=None):
+        """Cached value for key, calling compute() and storing its result on a miss"""
+        if version is not None and version != self.version:
+            self.set_version(version)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Computed without holding a lock; concurrent misses may both compute
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        return {'backend': type(self).__name__, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations,
+                'size': len(self), 'maxsize': self.maxsize, 'ttl': self.ttl, 'version': self.version}
+
+
+class LRUCache(Cache):
+    """Least-recently-used mapping held in this process"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None, version=None):
+        super().__init__(maxsize, ttl, version)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop_version(self, version):
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._expires(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class SQLiteCache(Cache):
+    """Cache in an SQLite file shared by every process on the host
+
+    Values are pickled, so point it only at a file this application owns.
+    Each process (and so each forked worker) opens its own connection on
+    first use. hits, misses and evictions count this process's lookups;
+    size counts the entries of the current version across all processes.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS entries ('
+              'version TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, '
+              'expires REAL, used REAL NOT NULL, PRIMARY KEY (version, key))')
+
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE, ttl=None, version=None, timeout=5.0):
+        super().__init__(maxsize, ttl, version)
+        self.path = path
+        self.timeout = timeout
+        self._pid = None
+        self._connection = None
+
+    def _connect(self):
+        # A connection must not cross a fork, so reopen in each new process
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(self.SCHEMA)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _version(self):
+        return '' if self.version is None else str(self.version)
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM entries WHERE version = ?',
+                                           (self._version(),)).fetchone()[0]
+
+    def _drop_version(self, version):
+        version = '' if version is None else str(version)
+        with self._lock:
+            return self._connect().execute('DELETE FROM entries WHERE version != ?', (version,)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute('DELETE FROM entries WHERE version = ?', (self._version(),))
+
+    def get(self, key, default=None):
+        key, now = repr(key), time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute('SELECT value FROM entries WHERE version = ? AND key = ? '
+                                     'AND (expires IS NULL OR expires > ?)',
+                                     (self._version(), key, now)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            connection.execute('UPDATE entries SET used = ? WHERE version = ? AND key = ?',
+                               (now, self._version(), key))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        value, now = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                               (self._version(), repr(key), value, self._expires(), now))
+            # Drop expired entries, then the least recently used beyond maxsize
+            evicted = connection.execute('DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?',
+                                         (now,)).rowcount
+            evicted += connection.execute(
+                'DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries '
+                'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.maxsize,)).rowcount
+            self.evictions += evicted
+
+
+def open_cache(url='memory://', maxsize=DEFAULT_MAXSIZE, ttl=None):
+    """Cache backend for a memory:// or sqlite:///path URL"""
+    if url in (None, '', 'memory://'):
+        return LRUCache(maxsize, ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):], maxsize, ttl)
+    raise ValueError(f"Unknown cache URL {url!r}; expected memory:// or sqlite:///path")
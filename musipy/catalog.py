@@ -0,0 +1,61 @@
+"""Canonical song catalog: integer song ids and a title index
+
+Every table lists the same songs in the same order: the rows of
+songs_names.csv, the columns of song_cosines.csv and the rating columns of
+final.csv. A song's id is that position, and everything past the request
+edge (neighbour lists, ratings, scores) works on ids.
+
+The tables do not spell every title the same way: song_cosines.csv has
+'Sonata A Major ', 'Go Aaway', 'Frequency of  Heartbeat ' and a few more
+with trailing spaces. SongCatalog indexes every spelling of every table in
+one dict, keyed by normalize_title(), so any of them (and any case or
+spacing of them) resolves to the same id. Titles are displayed as
+songs_names.csv spells them.
+"""
+import numpy as np
+
+
+def normalize_title(title):
+    """Lookup key of a title: case-folded, with runs of whitespace collapsed and trimmed"""
+    return ' '.join(str(title).split()).casefold()
+
+
+class SongCatalog:
+    """Title, artist and genre by song id, and the normalized-title -> id index"""
+
+    def __init__(self, titles, artists, genres, aliases=()):
+        self.titles = np.asarray(titles, dtype=str)
+        self.artists = np.asarray(artists, dtype=str)
+        self.genres = np.asarray(genres, dtype=str)
+        self.index = {}
+        for spellings in [self.titles, *aliases]:
+            if len(spellings) != len(self.titles):
+                raise ValueError(f"{len(spellings)} alias titles for {len(self.titles)} songs")
+            for song_id, title in enumerate(spellings):
+                if self.index.setdefault(normalize_title(title), song_id) != song_id:
+                    raise ValueError(f"Title {title!r} names two songs")
+
+    @classmethod
+    def from_columns(cls, songs, aliases=()):
+        """Catalog of load_columns()' Title, Artist and Genre arrays, plus other tables' titles"""
+        return cls(songs['Title'], songs['Artist'], songs['Genre'], aliases)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def lookup(self, title, default=None):
+        """Id of a title under any known spelling, or default"""
+        return self.index.get(normalize_title(title), default)
+
+    def ids(self, titles):
+        """Array of the titles' ids, -1 for unknown titles"""
+        return np.array([self.index.get(normalize_title(title), -1) for title in titles], dtype=np.intp)
+
+    def resolve(self, titles):
+        """Ids of the known titles, in order, and the unknown titles"""
+        ids = self.ids(titles)
+        return ids[ids >= 0], [title for title, song_id in zip(titles, ids) if song_id < 0]
+
+    def rows(self, ids):
+        """(title, artist, genre) of the songs with these ids"""
+        return list(zip(self.titles[ids].tolist(), self.artists[ids].tolist(), self.genres[ids].tolist()))
@@ -0,0 +1,117 @@
+"""Read-only arrays shared by every worker process
+
+load_dataset() memory-maps the trait, rating and cosine blocks of the
+binary store (see musipy.store). The pages come from the OS page cache, so
+all gunicorn workers on a host share one physical copy instead of each
+holding its own DataFrames. Without a fresh store the same arrays are built
+from the CSVs in process memory.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from .distance import TRAIT_COLUMNS, PersonalityMatrix, normalize_rows
+from .paths import DATA_DIR, file_digest
+from .sparse import SparseRatings
+from .store import MISSING_VALUES, load_block, load_sparse_ratings, read_schema, store_dir_for, table_schema
+
+
+class Dataset:
+    """Users' traits and ratings plus the song cosine matrix, as NumPy arrays
+
+    userids are ASCII bytes; ratings are uint8 with one column per song in
+    song_titles, 0 where the user left the song unrated; sparse_ratings
+    holds only the rated cells (musipy.sparse), and rated(rows) gives
+    their mask. version identifies the source CSVs the arrays came from
+    and the users ingested into the store since.
+    generation counts the ingests (musipy.ingest) into the store since it
+    was built, and ingested_at is the time of the last one.
+    """
+
+    def __init__(self, userids, traits, unit_traits, ratings, song_titles,
+                 cosines, cosine_titles, version, mapped=False, generation=0, ingested_at=None,
+                 sparse_ratings=None):
+        self.userids = userids
+        self.traits = traits
+        self.unit_traits = unit_traits
+        self.ratings = ratings
+        self.song_titles = list(song_titles)
+        self.cosines = cosines
+        self.cosine_titles = list(cosine_titles)
+        self.version = version
+        self.mapped = mapped
+        self.generation = generation
+        self.ingested_at = ingested_at
+        self.sparse_ratings = sparse_ratings
+        for values in (traits, unit_traits, ratings, cosines):
+            if not isinstance(values, np.memmap):
+                values.setflags(write=False)
+        self.personality_matrix = PersonalityMatrix.from_unit(unit_traits)
+
+    def __len__(self):
+        return len(self.traits)
+
+    def rated(self, rows):
+        """Mask of the cells of ratings[rows] that hold a rating, or None if every cell does"""
+        if self.sparse_ratings is None:
+            return None
+        return self.sparse_ratings.rated(rows)
+
+
+def _dataset_version(*digests):
+    return hashlib.sha1(''.join(digests).encode()).hexdigest()[:16]
+
+
+def _load_mapped(final_path, cosines_path, mmap_mode):
+    users = table_schema('users', final_path)
+    cosine_table = table_schema('song_cosines', cosines_path)
+    if users is None or cosine_table is None:
+        return None
+    blocks = {name: load_block('users', name, final_path, mmap_mode)
+              for name in ['userid', 'traits', 'traits_unit', 'ratings']}
+    cosines = load_block('song_cosines', 'cosines', cosines_path, mmap_mode)
+    sparse_ratings = load_sparse_ratings(final_path, mmap_mode)
+    if cosines is None or sparse_ratings is None or any(block is None for block in blocks.values()):
+        return None
+    song_titles = next(b['columns'] for b in users['blocks'] if b['name'] == 'ratings')
+    schema = read_schema(store_dir_for(final_path)) or {}
+    if schema.get('tables', {}).get('users', {}).get('ingest_sha1') != users.get('ingest_sha1'):
+        # Another ingest committed while the blocks were mapped
+        schema = {'generation': None}
+    # Ingested users are only in the store, so their digest is part of the version
+    return Dataset(blocks['userid'], blocks['traits'], blocks['traits_unit'], blocks['ratings'],
+                   song_titles, cosines, cosine_table['columns'],
+                   _dataset_version(users['source_sha1'], cosine_table['source_sha1'], users.get('ingest_sha1', '')),
+                   mapped=mmap_mode is not None, generation=schema.get('generation', 0),
+                   ingested_at=schema.get('ingested_at'), sparse_ratings=sparse_ratings)
+
+
+def _load_csv(final_path, cosines_path):
+    import pandas as pd
+
+    frame = pd.read_csv(final_path)
+    cosine_frame = pd.read_csv(cosines_path)
+    song_titles = [c for c in frame.columns if c not in ['userid', 'country_of_residence'] + TRAIT_COLUMNS]
+    traits = frame[TRAIT_COLUMNS].to_numpy(dtype=np.float64)
+    # userids are kept as bytes, as the store holds them
+    userids = np.array(frame['userid'].astype(str).to_numpy(), dtype=np.bytes_)
+    # Blank ratings are unrated, as is the missing value; neither is in the sparse ratings
+    missing = MISSING_VALUES['users']
+    ratings = np.nan_to_num(frame[song_titles].to_numpy(dtype=np.float64), nan=missing).astype(np.uint8)
+    sparse_ratings = SparseRatings.from_dense(ratings, missing=missing)
+    return Dataset(userids, traits, normalize_rows(traits), ratings, song_titles,
+                   cosine_frame.to_numpy(dtype=np.float64), cosine_frame.columns,
+                   _dataset_version(file_digest(final_path), file_digest(cosines_path)),
+                   sparse_ratings=sparse_ratings)
+
+
+def load_dataset(data_dir=DATA_DIR, mmap_mode='r'):
+    """Memory-map the store in data_dir, or fall back to parsing the CSVs"""
+    final_path = os.path.join(data_dir, 'final.csv')
+    cosines_path = os.path.join(data_dir, 'song_cosines.csv')
+    dataset = _load_mapped(final_path, cosines_path, mmap_mode)
+    if dataset is None:
+        print("Binary store missing or stale, loading the dataset from CSV.")
+        dataset = _load_csv(final_path, cosines_path)
+    return dataset
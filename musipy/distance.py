@@ -0,0 +1,61 @@
+import numpy as np
+
+# Big Five trait columns, in the order they appear in final.csv
+TRAIT_COLUMNS = ['ope', 'con', 'ext', 'agr', 'neu']
+
+
+def as_trait_vector(profile):
+    """Return a profile (dict or sequence) as a float array in TRAIT_COLUMNS order"""
+    if hasattr(profile, 'keys'):
+        return np.array([float(profile[trait]) for trait in TRAIT_COLUMNS])
+    return np.asarray(profile, dtype=np.float64).reshape(len(TRAIT_COLUMNS))
+
+
+def normalize_rows(values, dtype=np.float32):
+    """Scale every row to unit length; all-zero rows are left as zeros"""
+    values = np.asarray(values, dtype=np.float64)
+    norms = np.linalg.norm(values, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(values / norms, dtype=dtype)
+
+
+class PersonalityMatrix:
+    """Pre-normalised trait matrix scored with a single matrix-vector product
+
+    Cosine distance is 1 - u.v / (|u| |v|), so once every row is scaled to
+    unit length the distances to a query are 1 - rows @ (q / |q|).
+    """
+
+    def __init__(self, traits, dtype=np.float32):
+        self.unit = normalize_rows(traits, dtype)
+        self.unit.setflags(write=False)
+
+    @classmethod
+    def from_unit(cls, unit):
+        """Wrap rows that are already unit length (e.g. a memory-mapped block) without copying"""
+        matrix = cls.__new__(cls)
+        matrix.unit = unit
+        return matrix
+
+    @classmethod
+    def from_frame(cls, frame, dtype=np.float32):
+        """Build the matrix from the trait columns of a final.csv DataFrame"""
+        return cls(frame[TRAIT_COLUMNS].to_numpy(), dtype)
+
+    def __len__(self):
+        return self.unit.shape[0]
+
+    def similarities(self, profile):
+        """Cosine similarity of every row to the profile"""
+        query = normalize_rows(as_trait_vector(profile), self.unit.dtype)
+        return self.unit @ query
+
+    def distances(self, profile):
+        """Cosine distance of every row to the profile, as scipy's ds.cosine"""
+        distances = self.similarities(profile)
+        np.subtract(1, distances, out=distances)
+        return distances
+
+    def ranking(self, profile):
+        """Row positions ordered from nearest to farthest; ties keep row order"""
+        return np.argsort(self.distances(profile), kind='stable')
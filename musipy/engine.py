@@ -0,0 +1,384 @@
+"""The recommendation engine every front-end calls
+
+Engine owns the data (the memory-mapped dataset, with its song cosines,
+and the song metadata), the nearest-user index, the result cache and the
+compute pool, and scores requests with them. The Flask pages, the JSON API and the
+Streamlit apps all go through its methods, so a faster index, cache or
+scorer lands in one place:
+
+    engine = Engine.from_env().load()
+    result = engine.recommend({'ope': 4.1, 'con': 3.2, 'ext': 2.5, 'agr': 3.9, 'neu': 2.2})
+    engine.song_rows(result.song_indices)      # [(title, artist, genre), ...]
+
+Songs are integer ids, their position in every song table; engine.catalog
+turns titles into ids at the edges (see musipy.catalog).
+
+from_env() reads the same variables the Flask app documents:
+
+    MUSIPY_CACHE_URL     memory:// (per process) or sqlite:///path (shared)
+    MUSIPY_CACHE_SIZE    cached results kept (4096)
+    MUSIPY_CACHE_TTL     seconds a result is kept (no limit)
+    MUSIPY_POOL_THREADS  scoring threads (one per CPU; 0 scores inline)
+    MUSIPY_POOL_QUEUE    jobs allowed to wait before PoolBusy (32)
+    MUSIPY_POOL_TIMEOUT  seconds before PoolTimeout (30)
+    MUSIPY_USER_INDEX    brute, kdtree, ivf[:<n_probe>] or grid[:refine]
+    MUSIPY_REFRESH_INTERVAL  seconds between checks for ingested users (5;
+                             0 checks on every request, -1 never)
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import cached_property
+
+from .aggregate import (DEFAULT_PER_USER, DEFAULT_RULE, DEFAULT_SONGS, DEFAULT_THRESHOLD, RULES, rank_songs,
+                        similarity_weights)
+from .batch import as_profile_matrix
+from .cache import DEFAULT_MAXSIZE, LRUCache, open_cache, profile_key
+from .catalog import SongCatalog
+from .dataset import load_dataset
+from .distance import as_trait_vector
+from .paths import DATA_DIR, MODELS_DIR
+from .pool import ComputePool
+from .similarity import DEFAULT_DISLIKE_WEIGHT, similar_to_seeds
+from .store import SCHEMA_NAME
+from .user_index import DEFAULT_INDEX, build_index
+
+# Profile used to exercise the scoring path during warm-up
+WARM_UP_PROFILE = {'ope': 3.0, 'con': 3.0, 'ext': 3.0, 'agr': 3.0, 'neu': 3.0}
+
+# One profile's answer: its nearest users, nearest first, and its songs, best first
+Recommendation = namedtuple('Recommendation', 'user_indices user_distances song_indices song_scores')
+
+
+def _read_only(*arrays):
+    for values in arrays:
+        values.setflags(write=False)
+    return arrays
+
+
+class Engine:
+    """Data, indexes, result cache and compute pool shared by every request
+
+    Build one per process with load() (or warm_up()). Under gunicorn
+    --preload that happens in the master, and the forked workers inherit
+    everything copy-on-write. Tables only some front-ends use (the pandas
+    frames, the KNN model) are loaded on first access.
+
+    Answers are cached per dataset version, so a rebuilt dataset never
+    serves stale results. Cached arrays are read-only, as they are shared.
+
+    refresh() swaps in users ingested since (see musipy.ingest) at most every
+    refresh_interval seconds; None leaves the loaded data as it is.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, user_index=DEFAULT_INDEX, cache=None, pool=None,
+                 refresh_interval=None):
+        self.data_dir = data_dir
+        self.user_index_spec = user_index
+        self.cache = cache if cache is not None else LRUCache()
+        self.pool = pool if pool is not None else ComputePool(max_workers=0)
+        self.refresh_interval = refresh_interval
+        self.dataset = None
+        self.user_index = None
+        self.timings = {}
+        self.refreshes = {'count': 0, 'picked_up_at': None, 'staleness': None}
+        self._refresh_lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._schema_mtime = None
+
+    @classmethod
+    def from_env(cls, data_dir=DATA_DIR, environ=None):
+        """Engine configured from the MUSIPY_* environment variables"""
+        env = os.environ if environ is None else environ
+        cache = open_cache(env.get('MUSIPY_CACHE_URL', 'memory://'),
+                           int(env.get('MUSIPY_CACHE_SIZE', DEFAULT_MAXSIZE)),
+                           float(env['MUSIPY_CACHE_TTL']) if env.get('MUSIPY_CACHE_TTL') else None)
+        pool = ComputePool(int(env['MUSIPY_POOL_THREADS']) if env.get('MUSIPY_POOL_THREADS') else None,
+                           int(env.get('MUSIPY_POOL_QUEUE', '32')),
+                           float(env.get('MUSIPY_POOL_TIMEOUT', '30')))
+        refresh_interval = float(env.get('MUSIPY_REFRESH_INTERVAL', '5'))
+        return cls(data_dir, env.get('MUSIPY_USER_INDEX', DEFAULT_INDEX), cache, pool,
+                   refresh_interval if refresh_interval >= 0 else None)
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    @property
+    def version(self):
+        """Version of the loaded dataset, which namespaces cached answers"""
+        return None if self.dataset is None else self.dataset.version
+
+    def _schema_stamp(self):
+        try:
+            return os.stat(os.path.join(self.data_dir, 'store', SCHEMA_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _build_user_index(self, unit, previous=None):
+        # An index over a prefix of these rows only needs the new ones added, if it can
+        if previous is not None and hasattr(previous, 'extended'):
+            return previous.extended(unit)
+        try:
+            return build_index(self.user_index_spec, unit)
+        except (FileNotFoundError, ValueError) as e:
+            # e.g. the grid table was never built or is stale (python -m musipy.grid)
+            print(f"User index {self.user_index_spec} unavailable ({e}), using brute force.")
+            return build_index(DEFAULT_INDEX, unit)
+
+    def load(self):
+        """Memory-map the dataset and build the user index"""
+        # Taken first, so a commit during loading is picked up by the next refresh()
+        self._schema_mtime = self._schema_stamp()
+
+        # Memory-map the user traits, ratings and song cosines shared by all workers
+        try:
+            self.dataset = load_dataset(self.data_dir)
+            print(f"Dataset {self.dataset.version} loaded successfully "
+                  f"({'memory-mapped' if self.dataset.mapped else 'in memory'}).")
+        except FileNotFoundError:
+            print("Dataset files not found.")
+
+        # Build the nearest-user index over the mapped trait matrix
+        if self.dataset is not None:
+            self.user_index = self._build_user_index(self.dataset.unit_traits)
+            print(f"User index {self.user_index.spec} built over {len(self.user_index)} users.")
+        return self
+
+    def refresh(self):
+        """Swap in users ingested since the data was loaded; True if the dataset changed
+
+        Checks the store's schema at most every refresh_interval seconds.
+        Requests already running keep the arrays they started with. The
+        dataset is swapped before the user index: rows are only ever
+        appended, so an older index's positions stay valid in a newer
+        dataset while the two differ.
+        """
+        if self.refresh_interval is None or self.dataset is None:
+            return False
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return False
+        with self._refresh_lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return False
+            self._checked_at = time.monotonic()
+            stamp = self._schema_stamp()
+            if stamp == self._schema_mtime:
+                return False
+            try:
+                dataset = load_dataset(self.data_dir)
+            except FileNotFoundError as e:
+                # Files of a superseded schema; the next check sees the new one
+                print(f"Dataset refresh failed ({e}), keeping version {self.version}.")
+                return False
+            self._schema_mtime = stamp
+            if dataset.version == self.version:
+                return False
+            # An ingest appended rows; anything else (python -m musipy.store) rebuilt the store
+            appended = (dataset.generation is not None and self.dataset.generation is not None
+                        and dataset.generation > self.dataset.generation and len(dataset) >= len(self.dataset))
+            user_index = self._build_user_index(dataset.unit_traits, self.user_index if appended else None)
+            if len(dataset) < len(self.dataset):
+                # Fewer rows than before: swap the index first so no position runs past the dataset
+                self.user_index = user_index
+            self.dataset = dataset
+            self.user_index = user_index
+            for name in ('song_cosines', 'users'):
+                self.__dict__.pop(name, None)
+
+            picked_up_at = time.time()
+            self.refreshes = {'count': self.refreshes['count'] + 1, 'picked_up_at': picked_up_at,
+                              'staleness': None if dataset.ingested_at is None else picked_up_at - dataset.ingested_at}
+            print(f"Dataset {dataset.version} (generation {dataset.generation}) swapped in "
+                  f"with {len(dataset)} users.")
+            return True
+
+    def warm_up(self, profile=WARM_UP_PROFILE):
+        """load(), then run one query so the first request starts hot"""
+        start = time.perf_counter()
+        self.load()
+        loaded = time.perf_counter()
+
+        # Fault in the mapped pages and initialise BLAS before any request does
+        if self.dataset is not None:
+            self.nearest_users(profile, 5)
+            self.dataset.ratings.sum()
+
+        # Pages show song metadata, so load it up front; the pandas tables
+        # and the model are not used to serve requests and stay unloaded
+        self.catalog
+
+        done = time.perf_counter()
+        self.timings = {'load': loaded - start, 'warm_up': done - loaded, 'total': done - start}
+        print(f"Warm-up finished in {1000 * self.timings['total']:.1f} ms.")
+        return self
+
+    @cached_property
+    def estimator(self):
+        """The compact KNN model (see musipy.knn), memory-mapped so workers share it"""
+        from .knn import MODEL_PATH, load_model
+        try:
+            estimator = load_model(MODEL_PATH, pickle_path=os.path.join(MODELS_DIR, 'knn.pkl'))
+            print("Model loaded successfully.")
+            return estimator
+        except FileNotFoundError:
+            print("Model file not found.")
+        except (ValueError, ModuleNotFoundError) as e:
+            print(f"Model could not be loaded: {e}")
+        return None
+
+    @cached_property
+    def songs(self):
+        """Title, Artist and Genre arrays of songs_names.csv, without pandas"""
+        from .store import load_columns
+        try:
+            songs = load_columns('song_names', ['Title', 'Artist', 'Genre'], self._path('songs_names.csv'))
+            print("Song metadata loaded successfully.")
+            return songs
+        except FileNotFoundError:
+            print("Songs names CSV file not found.")
+        return None
+
+    @cached_property
+    def song_names(self):
+        """songs_names.csv as a DataFrame (binary store, or the CSV if it is missing or stale)"""
+        from .store import load_song_names
+        try:
+            song_names = load_song_names(self._path('songs_names.csv'))
+            print("Songs names CSV file loaded successfully.")
+            return song_names
+        except FileNotFoundError:
+            print("Songs names CSV file not found.")
+        return None
+
+    @cached_property
+    def song_cosines(self):
+        """song_cosines.csv as a DataFrame"""
+        from .store import load_song_cosines
+        try:
+            song_cosines = load_song_cosines(self._path('song_cosines.csv'))
+            print("Song cosines CSV file loaded successfully.")
+            return song_cosines
+        except FileNotFoundError:
+            print("Song cosines CSV file not found.")
+        return None
+
+    @cached_property
+    def users(self):
+        """final.csv as a DataFrame, in the dataset's row order"""
+        from .store import load_users
+        try:
+            users = load_users(self._path('final.csv'))
+            print("Users CSV file loaded successfully.")
+            return users
+        except FileNotFoundError:
+            print("Users CSV file not found.")
+        return None
+
+    @cached_property
+    def catalog(self):
+        """Song ids, metadata and the title index over every table's spelling (see musipy.catalog)"""
+        if self.songs is None:
+            return None
+        aliases = []
+        if self.dataset is not None:
+            aliases += [self.dataset.cosine_titles, self.dataset.song_titles]
+        return SongCatalog.from_columns(self.songs, aliases)
+
+    def song_rows(self, song_ids):
+        """(title, artist, genre) of the songs with these ids"""
+        return self.catalog.rows(song_ids)
+
+    def nearest_users(self, profile, n_users=5):
+        """Positions and cosine distances of the n_users nearest one profile, as read-only arrays"""
+        indices, distances = self.user_index.search(as_trait_vector(profile), n_users)
+        return _read_only(indices[0], distances[0])
+
+    def rank_songs(self, user_indices, user_distances, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER,
+                   n_songs=DEFAULT_SONGS, rule=DEFAULT_RULE):
+        """Recommendation from already found nearest users, ranked by rule (see musipy.aggregate.rank_songs)
+
+        Songs a neighbour left unrated never count for or against them.
+        """
+        dataset = self.dataset
+        ranking = rank_songs(dataset.ratings[user_indices], similarity_weights(user_distances),
+                             rule, threshold, per_user, n_songs, rated=dataset.rated(user_indices))
+        return Recommendation(user_indices, user_distances, *_read_only(ranking.indices, ranking.scores))
+
+    def _recommend_key(self, profile, n_users, threshold, per_user, n_songs, rule):
+        if rule == 'mean':
+            # The mean rule has no threshold or cap; keep one entry for it
+            threshold = per_user = None
+        key = profile_key(profile, scale_invariant=self.user_index.scale_invariant)
+        return ('recommend', self.user_index.spec, key, n_users, rule, threshold, per_user, n_songs)
+
+    def _recommend(self, profile, n_users, threshold, per_user, n_songs, rule):
+        return self.rank_songs(*self.nearest_users(profile, n_users), threshold, per_user, n_songs, rule)
+
+    def recommend(self, profile, n_users=5, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER,
+                  n_songs=DEFAULT_SONGS, rule=DEFAULT_RULE):
+        """Recommendation for one profile: its nearest users' songs, ranked by rule (see musipy.aggregate)
+
+        Scored on the compute pool, and answered from the cache when the
+        profile was seen before.
+        """
+        if rule not in RULES:
+            raise ValueError(f"rule must be one of {', '.join(RULES)}, not {rule!r}")
+        return self.cache.get_or_compute(
+            self._recommend_key(profile, n_users, threshold, per_user, n_songs, rule),
+            lambda: self.pool.run(self._recommend, profile, n_users, threshold, per_user, n_songs, rule),
+            version=self.version)
+
+    def _recommend_batch(self, profiles, n_users, threshold, per_user, n_songs, rule):
+        # The index is read before the dataset, which refresh() swaps first
+        index = self.user_index
+        user_indices, user_distances = index.search(as_profile_matrix(profiles), n_users)
+        return [self.rank_songs(*_read_only(indices, distances), threshold, per_user, n_songs, rule)
+                for indices, distances in zip(user_indices, user_distances)]
+
+    def recommend_profiles(self, profiles, n_users=5, threshold=DEFAULT_THRESHOLD, per_user=DEFAULT_PER_USER,
+                           n_songs=DEFAULT_SONGS, rule=DEFAULT_RULE):
+        """recommend() for many profiles, sharing its cache entries
+
+        Profiles seen before come from the cache; the users nearest the rest
+        are searched in one batch on the compute pool.
+        """
+        if rule not in RULES:
+            raise ValueError(f"rule must be one of {', '.join(RULES)}, not {rule!r}")
+        self.cache.set_version(self.version)
+        keys = [self._recommend_key(row, n_users, threshold, per_user, n_songs, rule) for row in profiles]
+        results = [self.cache.get(key) for key in keys]
+        missing = [i for i, found in enumerate(results) if found is None]
+        if missing:
+            batch = self.pool.run(self._recommend_batch, [profiles[i] for i in missing],
+                                  n_users, threshold, per_user, n_songs, rule)
+            for result, i in zip(batch, missing):
+                results[i] = result
+                self.cache.put(keys[i], result)
+        return results
+
+    def similar_songs(self, song_ids, n_songs=10, disliked=(), dislike_weight=DEFAULT_DISLIKE_WEIGHT):
+        """(song id, score) of the n_songs songs most similar to the seed song ids as a whole, best first
+
+        A song's score is its mean cosine similarity to the seeds, minus
+        dislike_weight times its mean similarity to the disliked song ids
+        (see musipy.similarity.similar_to_seeds); the seeds and disliked
+        songs are left out. Resolve titles with catalog.resolve() first.
+        """
+        seeds = tuple(sorted({int(song_id) for song_id in song_ids}))
+        disliked = tuple(sorted({int(song_id) for song_id in disliked} - set(seeds)))
+
+        def compute():
+            ranking = similar_to_seeds(self.dataset.cosines, seeds, disliked, n_songs, dislike_weight)
+            return tuple(zip(ranking.indices.tolist(), ranking.scores.tolist()))
+
+        return self.cache.get_or_compute(('similar', seeds, disliked, n_songs, dislike_weight), compute,
+                                         version=self.version)
+
+    def stats(self):
+        """Result cache and compute pool counters of this process, and the data it serves"""
+        data = None
+        if self.dataset is not None:
+            data = dict(self.refreshes, version=self.version, generation=self.dataset.generation,
+                        users=len(self.dataset), ingested_at=self.dataset.ingested_at)
+        return {'cache': self.cache.stats(), 'pool': self.pool.stats(), 'data': data}
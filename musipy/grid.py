@@ -0,0 +1,183 @@
+"""Precomputed nearest users for a grid over the 1-5 trait scale
+
+Profiles come in with 2 decimal places on a bounded scale, so the answers
+for a coarse grid of profiles can be computed offline. Every grid point
+stores its n_candidates nearest users, nearest first. A query is served
+from the grid point nearest to it:
+
+    lookup   the nearest point's first k users, no ranking at query time
+    refine   the candidates of all 32 corners of the query's grid cell,
+             re-ranked by exact distance to the query
+
+Asking for more users than a point stores falls back to brute force.
+
+The table records the SHA-1 of the trait matrix it was built from, and
+loading it against any other matrix fails, so stale answers are never
+served. It plugs in as the 'grid' and 'grid:refine' user indexes (see
+musipy.user_index). Build it, and see how far its answers are from exact
+ones, with:
+
+    python -m musipy.grid --step 0.5 --candidates 32
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from .distance import TRAIT_COLUMNS, normalize_rows
+from .paths import DATA_DIR
+from .topk import top_k
+from .user_index import BruteForceIndex, build_index
+
+# Bump when the layout of the .npz file changes
+FORMAT_VERSION = 1
+USER_GRID_PATH = os.path.join(DATA_DIR, 'user_grid.npz')
+DEFAULT_STEP = 0.5
+DEFAULT_CANDIDATES = 32
+
+
+def unit_digest(unit):
+    """SHA-1 of a trait matrix, tying a grid to the users it was built over"""
+    return hashlib.sha1(np.ascontiguousarray(unit).tobytes()).hexdigest()
+
+
+class UserGrid(BruteForceIndex):
+    """Grid of precomputed nearest-user candidates, searchable like a user index"""
+
+    name = 'grid'
+    # The grid cell comes from the profile itself, not its direction
+    scale_invariant = False
+
+    def __init__(self, unit, candidates, low, high, step, refine=False):
+        super().__init__(unit)
+        self.candidates = candidates
+        self.low, self.high, self.step = float(low), float(high), float(step)
+        self.points = int(round((self.high - self.low) / self.step)) + 1
+        self.refine = refine
+
+    @property
+    def spec(self):
+        return 'grid:refine' if self.refine else 'grid'
+
+    @property
+    def n_candidates(self):
+        return self.candidates.shape[1]
+
+    @classmethod
+    def build(cls, unit, low=1.0, high=5.0, step=DEFAULT_STEP, n_candidates=DEFAULT_CANDIDATES,
+              index='kdtree'):
+        """Search every grid point with a user index (the k-d tree by default, brute force up to float32 ties)"""
+        points = int(round((high - low) / step)) + 1
+        axis = low + step * np.arange(points)
+        grid = np.stack(np.meshgrid(*[axis] * len(TRAIT_COLUMNS), indexing='ij'), axis=-1)
+        candidates, _ = build_index(index, unit).search(grid.reshape(-1, len(TRAIT_COLUMNS)), n_candidates)
+        # Store positions in the smallest integer type that holds them
+        return cls(unit, candidates.astype(np.min_scalar_type(len(unit) - 1)), low, high, step)
+
+    @classmethod
+    def load(cls, unit, path=USER_GRID_PATH, refine=False):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"unsupported user grid format {int(data['format_version'])}")
+            if str(data['unit_sha1']) != unit_digest(unit):
+                raise ValueError("user grid was built from other users; rebuild it")
+            return cls(unit, data['candidates'], data['low'], data['high'], data['step'], refine)
+
+    def save(self, path=USER_GRID_PATH):
+        # Write through the open file so numpy does not append a second .npz,
+        # next to the target and swapped in so workers never map half a file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, format_version=FORMAT_VERSION, unit_sha1=unit_digest(self.unit),
+                     candidates=self.candidates, low=self.low, high=self.high, step=self.step)
+        os.replace(tmp_path, path)
+
+    def cells(self, profiles):
+        """Row of the grid point nearest each (n, 5) profile; profiles off the scale are clipped"""
+        steps = np.clip(np.rint((profiles - self.low) / self.step), 0, self.points - 1).astype(np.intp)
+        return np.ravel_multi_index(steps.T, (self.points,) * len(TRAIT_COLUMNS))
+
+    def corner_cells(self, profiles):
+        """(n, 32) rows of the grid points at the corners of each profile's grid cell"""
+        base = np.clip(np.floor((profiles - self.low) / self.step), 0, self.points - 2).astype(np.intp)
+        corners = (np.arange(2 ** len(TRAIT_COLUMNS))[:, None] >> np.arange(len(TRAIT_COLUMNS))) & 1
+        steps = base[:, None, :] + corners
+        return np.ravel_multi_index(np.moveaxis(steps, -1, 0), (self.points,) * len(TRAIT_COLUMNS))
+
+    def search(self, profiles, k):
+        profiles = np.asarray(profiles, dtype=np.float64).reshape(-1, len(TRAIT_COLUMNS))
+        if k > self.n_candidates:
+            # The table only holds n_candidates users per point; search everyone
+            # rather than return fewer users than asked for
+            return super().search(profiles, k)
+        queries = normalize_rows(profiles, self.unit.dtype)
+        if not self.refine:
+            candidates = self.candidates[self.cells(profiles), :k].astype(np.intp)
+            distances = 1 - np.einsum('mkd,md->mk', self.unit[candidates], queries)
+            return candidates, distances
+
+        # Every user stored for any corner of the query's cell, in row order so
+        # ties break by position as brute force does; repeats are ranked last
+        candidates = self.candidates[self.corner_cells(profiles)].reshape(len(profiles), -1).astype(np.intp)
+        candidates.sort(axis=1)
+        distances = 1 - np.einsum('mkd,md->mk', self.unit[candidates], queries)
+        distances[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = np.inf
+        chosen = top_k(distances, min(k, len(self.unit)))
+        return np.take_along_axis(candidates, chosen, axis=1), np.take_along_axis(distances, chosen, axis=1)
+
+
+def load_user_grid(unit, path=USER_GRID_PATH, refine=False):
+    """The precomputed grid for these users; FileNotFoundError or ValueError if missing or stale"""
+    return UserGrid.load(unit, path, refine)
+
+
+def evaluate(grid, unit, n_queries=2000, k=5, seed=0):
+    """Recall@k and exact-answer rate of lookup and refine vs brute force on random 2-decimal profiles"""
+    rng = np.random.default_rng(seed)
+    queries = np.round(rng.uniform(grid.low, grid.high, size=(n_queries, len(TRAIT_COLUMNS))), 2)
+    exact, exact_distances = BruteForceIndex(unit).search(queries, k)
+    report = {}
+    for refine in (False, True):
+        grid.refine = refine
+        start = time.perf_counter()
+        found, distances = grid.search(queries, k)
+        elapsed = time.perf_counter() - start
+        report[grid.spec] = {
+            'recall': float(np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(found, exact)])),
+            'exact': float(np.mean((found == exact).all(axis=1))),
+            # How much farther the returned k-th user is than the true k-th
+            'kth_distance_gap': float(np.mean(distances[:, -1] - exact_distances[:, -1])),
+            'us_per_query': 1e6 * elapsed / n_queries,
+        }
+    grid.refine = False
+    return report
+
+
+def main():
+    from .dataset import load_dataset
+
+    parser = argparse.ArgumentParser(description='Precompute nearest users for a grid of profiles.')
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP, help='grid spacing on the 1-5 scale')
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES, help='users stored per grid point')
+    parser.add_argument('--index', default='kdtree',
+                        help='user index used to search the grid points (kdtree matches brute up to float32 ties)')
+    parser.add_argument('--output', default=USER_GRID_PATH)
+    parser.add_argument('--queries', type=int, default=2000, help='random profiles in the error report')
+    args = parser.parse_args()
+
+    unit = load_dataset().unit_traits
+    start = time.perf_counter()
+    grid = UserGrid.build(unit, step=args.step, n_candidates=args.candidates, index=args.index)
+    grid.save(args.output)
+    print(f"Wrote {len(grid.candidates)} grid points x {grid.n_candidates} users "
+          f"({grid.candidates.dtype}, {os.path.getsize(args.output) / 2 ** 20:.1f} MiB) to {args.output} "
+          f"in {time.perf_counter() - start:.1f} s")
+    for spec, row in evaluate(grid, unit, args.queries).items():
+        print(f"  {spec:<12} recall@5 {row['recall']:.4f}  exact top 5 {row['exact']:.1%}  "
+              f"k-th distance gap {row['kth_distance_gap']:.2e}  {row['us_per_query']:.1f} us/query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Distances to one profile that follow it as it changes
+
+A Streamlit session reruns its script on every widget change, but from one
+rerun to the next the profile usually moves a single slider. With the
+users' unit vectors U and a profile p, the cosine distances are
+1 - (U @ p) / |p|, and changing trait j by delta changes U @ p by
+delta * U[:, j]. So the dot products are kept between calls and updated one
+column per changed trait instead of recomputed in full. When the rounded
+profile has not changed, the last answer is returned as it is.
+
+Pass the matrix in column-major order (np.asfortranarray) so each trait's
+column is contiguous; a row-major matrix makes every column update read
+the whole matrix. The nearest users have the largest dot products, as |p|
+is the same for all of them, so only the k selected get a distance.
+
+Rounding error accumulates across column updates, so the dot products are
+recomputed in full every refresh_every updates. Distances match the
+brute-force index's to float32 rounding; users tied that closely may swap
+places.
+"""
+import numpy as np
+
+from .distance import as_trait_vector
+from .topk import top_k
+
+
+class IncrementalDistances:
+    """Cosine distances from every user to the latest profile, updated per changed trait"""
+
+    def __init__(self, unit, decimals=2, refresh_every=16):
+        self.unit = unit
+        self.decimals = decimals
+        self.refresh_every = refresh_every
+        self.profile = None
+        self.dots = None
+        self.last = None
+        self.since_refresh = 0
+        self.counts = {'skipped': 0, 'incremental': 0, 'full': 0}
+
+    def update(self, profile):
+        """Move to a profile (dict or sequence); returns 'skipped', 'incremental' or 'full'"""
+        profile = as_trait_vector(profile).round(self.decimals)
+        if self.profile is not None and np.array_equal(profile, self.profile):
+            kind = 'skipped'
+        else:
+            changed = [] if self.profile is None else np.flatnonzero(profile != self.profile)
+            if self.profile is None or len(changed) > 2 or self.since_refresh >= self.refresh_every:
+                self.dots = self.unit @ profile.astype(self.unit.dtype)
+                self.since_refresh = 0
+                kind = 'full'
+            else:
+                for j in changed:
+                    self.dots += self.unit.dtype.type(profile[j] - self.profile[j]) * self.unit[:, j]
+                self.since_refresh += 1
+                kind = 'incremental'
+            self.profile = profile
+        self.counts[kind] += 1
+        return kind
+
+    def nearest(self, profile, k):
+        """Positions and distances of the k users nearest the profile, nearest first"""
+        if self.update(profile) == 'skipped' and self.last is not None and self.last[0] == k:
+            return self.last[1:]
+        indices = top_k(self.dots, min(k, len(self.unit)), largest=True)
+        self.last = k, indices, 1 - self.dots[indices] / self.unit.dtype.type(np.linalg.norm(self.profile))
+        return self.last[1:]
@@ -0,0 +1,286 @@
+"""Append new respondents to the binary store while the app serves it
+
+ingest_users() adds users (userid, the five traits, an optional country and
+the 50 song ratings, blank or 0 where unrated) without rebuilding anything:
+
+    1. their rows are written past the committed rows of every users block,
+       whose .npy header is rewritten in place with the new row count;
+    2. the song-song cosines are updated from the running Gram matrix of
+       the ratings (musipy.similarity), so only the new rows are multiplied;
+    3. a new schema header commits it all at once (see musipy.store).
+
+The first ingest seeds the Gram matrix from the published song_cosines.csv
+and the column norms of the stored ratings, so existing cosines keep their
+values rather than being recomputed.
+
+Ingested users live in the store only: final.csv and song_cosines.csv are
+left as published, so the store stays current for them. Rebuilding the
+store from the CSVs (python -m musipy.store) drops the ingested users. The
+schema chains a digest of every ingested batch onto the CSV's, and the
+dataset version follows it.
+
+Running workers notice the new schema through Engine.refresh() and swap the
+dataset in without a restart. The schema records a generation counter and
+the commit time, so Engine.stats() reports how stale each worker is.
+
+    python -m musipy.ingest new_users.csv
+
+takes a CSV with final.csv's columns (or q1..q50 for the songs, as in
+big5_music_fixed.csv) and prints the ingest throughput.
+"""
+import argparse
+import copy
+import fcntl
+import glob
+import hashlib
+import io
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .distance import TRAIT_COLUMNS, normalize_rows
+from .paths import DATA_DIR
+from .similarity import SongCosines
+from .sparse import SparseRatings
+from .store import read_schema, sparse_blocks, table_schema, write_schema
+
+LOCK_NAME = 'ingest.lock'
+REBUILD_HINT = "rebuild the store with python -m musipy.store"
+
+# Users added by one ingest_users() call, the users now stored, the new store
+# generation and the seconds spent in each step
+IngestResult = namedtuple('IngestResult', 'rows users generation timings')
+
+
+def _chained_digest(previous, rows):
+    # Digest of the previous ingests and this batch, without rereading either
+    digest = hashlib.sha1((previous or '').encode())
+    for name in ('userid', 'traits', 'ratings'):
+        digest.update(np.ascontiguousarray(rows[name]).tobytes())
+    return digest.hexdigest()
+
+
+def _text_values(values, block):
+    """A text column in the block's stored dtype, or ValueError if it does not fit"""
+    dtype = np.dtype(block['stored_dtype'])
+    values = np.array(values, dtype=str)
+    try:
+        fitted = values.astype(np.bytes_ if dtype.kind == 'S' else np.str_)
+    except UnicodeEncodeError:
+        raise ValueError(f"{block['name']} values are not ASCII as the stored ones are; {REBUILD_HINT}")
+    if fitted.dtype.itemsize > dtype.itemsize:
+        raise ValueError(f"{block['name']} values are longer than the stored {dtype.str}; {REBUILD_HINT}")
+    return fitted.astype(dtype)
+
+
+def prepare_users(frame, entry, existing_userids):
+    """Block name -> rows to append for new users
+
+    Raises ValueError for missing columns, non-numeric or all-zero traits,
+    ratings outside the stored dtype, and userids already stored or repeated.
+    Blank ratings are stored as the missing value, unrated.
+    """
+    import pandas as pd
+
+    if not len(frame):
+        raise ValueError("No new users to ingest")
+    blocks = {block['name']: block for block in entry['blocks']}
+    song_columns = blocks['ratings']['columns']
+    q_columns = [f'q{i + 1}' for i in range(len(song_columns))]
+    if not all(column in frame for column in song_columns) and all(column in frame for column in q_columns):
+        frame = frame.rename(columns=dict(zip(q_columns, song_columns)))
+    missing = [column for column in ['userid'] + TRAIT_COLUMNS + song_columns if column not in frame]
+    if missing:
+        raise ValueError(f"New users lack the columns {', '.join(missing)}")
+
+    if frame['userid'].isna().any():
+        raise ValueError("Every new user needs a userid")
+    userids = _text_values(frame['userid'].astype(str).to_numpy(), blocks['userid'])
+    if len(np.unique(userids)) < len(userids):
+        raise ValueError("Duplicate userids among the new users")
+    if np.isin(userids, existing_userids).any():
+        raise ValueError("Some new userids are already stored")
+
+    traits = frame[TRAIT_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    if not np.isfinite(traits).all() or not np.abs(traits).sum(axis=1).all():
+        raise ValueError("Traits must be numbers, and not all zero")
+
+    # A blank rating is an unrated song, stored as the table's missing value
+    ratings = frame[song_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    blank = frame[song_columns].isna().to_numpy()
+    rating_dtype = np.dtype(blocks['ratings']['stored_dtype'])
+    limits = np.iinfo(rating_dtype)
+    values = ratings[~blank]
+    if not ((values == np.round(values)).all() and (values >= limits.min).all() and (values <= limits.max).all()):
+        raise ValueError(f"Ratings must be blank or whole numbers from {limits.min} to {limits.max}")
+    ratings = np.nan_to_num(ratings, nan=entry['missing_value']).astype(rating_dtype)
+    sparse = SparseRatings.from_dense(ratings, missing=entry['missing_value'])
+
+    countries = frame['country_of_residence'] if 'country_of_residence' in frame else pd.Series(index=frame.index,
+                                                                                               dtype=object)
+    rows = {'userid': userids, 'traits': traits,
+            'country_of_residence': _text_values(countries.fillna('').astype(str).to_numpy(),
+                                                 blocks['country_of_residence']),
+            'ratings': ratings, 'traits_unit': normalize_rows(traits)}
+    # indptr without its leading 0, counted from the new users' first entry
+    sparse_rows = sparse_blocks(sparse, rating_dtype)
+    sparse_rows['ratings_indptr'] = sparse_rows['ratings_indptr'][1:]
+    rows.update(sparse_rows)
+
+    return rows
+
+
+def append_block(path, values, committed):
+    """Write rows after the first `committed` rows of an .npy block and grow its header to match
+
+    Anything already past the committed rows (a crashed ingest) is overwritten.
+    """
+    fmt = np.lib.format
+    with open(path, 'r+b') as f:
+        version = fmt.read_magic(f)
+        read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+        if fortran_order or dtype != values.dtype or shape[1:] != values.shape[1:] or shape[0] < committed:
+            raise ValueError(f"{os.path.basename(path)} does not match the schema; {REBUILD_HINT}")
+
+        # numpy pads the header so the row count can grow without moving the data
+        header = io.BytesIO()
+        write_header = fmt.write_array_header_1_0 if version == (1, 0) else fmt.write_array_header_2_0
+        write_header(header, {'descr': fmt.dtype_to_descr(dtype), 'fortran_order': False,
+                              'shape': (committed + len(values),) + shape[1:]})
+        if len(header.getvalue()) != offset:
+            raise ValueError(f"{os.path.basename(path)} header cannot grow in place; {REBUILD_HINT}")
+
+        f.seek(offset + committed * dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64)))
+        f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(header.getvalue())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _song_cosines(store_dir, entry, cosines, ratings):
+    """Accumulator of the stored ratings, from the store or seeded from the published cosines"""
+    for block in entry['blocks']:
+        if block['name'] == 'gram':
+            return SongCosines(np.load(os.path.join(store_dir, block['file']), allow_pickle=False), len(ratings))
+    return SongCosines.from_cosines(cosines, np.sqrt(np.einsum('ij,ij->j', ratings, ratings, dtype=np.float64)),
+                                    len(ratings))
+
+
+def _save_block(store_dir, table, name, generation, values):
+    # Rewritten blocks get a new file per generation: the old schema keeps
+    # pointing at the old file until the new one commits
+    file_name = f'{table}.{name}.{generation}.npy'
+    tmp_path = os.path.join(store_dir, file_name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values, allow_pickle=False)
+    os.replace(tmp_path, os.path.join(store_dir, file_name))
+    return file_name
+
+
+def _remove_unused(store_dir, table, *schemas):
+    # Keep the files of the previous schema too, for readers that just read it
+    used = {block['file'] for schema in schemas for block in schema['tables'][table]['blocks']}
+    used.update(schema['tables'][table]['index'] for schema in schemas)
+    for path in glob.glob(os.path.join(store_dir, f'{table}.*.npy')):
+        if os.path.basename(path) not in used:
+            os.remove(path)
+
+
+def ingest_users(frame, data_dir=DATA_DIR):
+    """Append the users in a DataFrame to the store in data_dir and commit them
+
+    The store must be current (built from the CSVs as they are); only one
+    ingest runs at a time, others wait on a lock file in the store. The
+    CSVs are not modified.
+    """
+    final_path = os.path.join(data_dir, 'final.csv')
+    cosines_path = os.path.join(data_dir, 'song_cosines.csv')
+    store_dir = os.path.join(data_dir, 'store')
+    timings = {}
+    start = time.perf_counter()
+
+    with open(os.path.join(store_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        schema = read_schema(store_dir)
+        cosine_entry = table_schema('song_cosines', cosines_path)
+        if schema is None or cosine_entry is None or table_schema('users', final_path) is None:
+            raise ValueError(f"Binary store missing or stale; {REBUILD_HINT}")
+        entry = schema['tables']['users']
+        committed = entry['rows']
+        generation = schema.get('generation', 0) + 1
+        blocks = {block['name']: os.path.join(store_dir, block['file']) for block in entry['blocks']}
+
+        existing = np.load(blocks['userid'], mmap_mode='r', allow_pickle=False)[:committed]
+        rows = prepare_users(frame, entry, existing)
+        timings['validate'] = time.perf_counter() - start
+
+        # 1. New rows past the committed ones, invisible to readers until the commit.
+        # The sparse blocks count entries, and the new users' offsets follow the stored ones
+        counts = {block['name']: block.get('rows', committed) for block in entry['blocks']}
+        rows['ratings_indptr'] = rows['ratings_indptr'] + counts['ratings_data']
+        for name, values in rows.items():
+            append_block(blocks[name], values, counts[name])
+        timings['blocks'] = time.perf_counter() - start - sum(timings.values())
+
+        # 2. Song cosines from the running Gram matrix
+        cosine_block = next(block for block in cosine_entry['blocks'] if block['name'] == 'cosines')
+        cosines = np.load(os.path.join(store_dir, cosine_block['file']), allow_pickle=False)
+        ratings = np.load(blocks['ratings'], mmap_mode='r', allow_pickle=False)[:committed]
+        accumulator = _song_cosines(store_dir, cosine_entry, cosines, ratings).add(rows['ratings'])
+        cosines = accumulator.cosines()
+        cosine_files = {'cosines': _save_block(store_dir, 'song_cosines', 'cosines', generation, cosines),
+                        'gram': _save_block(store_dir, 'song_cosines', 'gram', generation, accumulator.gram)}
+        timings['cosines'] = time.perf_counter() - start - sum(timings.values())
+
+        # 3. Commit
+        new_schema = copy.deepcopy(schema)
+        users = new_schema['tables']['users']
+        users['rows'] = committed + len(rows['userid'])
+        users['ingest_sha1'] = _chained_digest(entry.get('ingest_sha1'), rows)
+        for block in users['blocks']:
+            if block['name'] == 'country_of_residence' and not rows['country_of_residence'].all():
+                block['nullable'] = True
+            if 'rows' in block:
+                block['rows'] = counts[block['name']] + len(rows[block['name']])
+        song_cosines = new_schema['tables']['song_cosines']
+        song_cosines['blocks'] = [
+            dict(cosine_block, file=cosine_files['cosines']),
+            {'name': 'gram', 'file': cosine_files['gram'], 'dtype': 'float64', 'stored_dtype': 'float64',
+             'columns': song_cosines['columns'], 'derived': True}]
+        new_schema['generation'] = generation
+        new_schema['ingested_at'] = time.time()
+        write_schema(store_dir, new_schema)
+        _remove_unused(store_dir, 'song_cosines', schema, new_schema)
+        timings['commit'] = time.perf_counter() - start - sum(timings.values())
+
+    return IngestResult(len(rows['userid']), users['rows'], generation, timings)
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Append new users to the binary store.')
+    parser.add_argument('input', help="CSV with final.csv's columns, or q1..q50 for the ratings")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--chunk-size', type=int, default=100000, help='users committed per ingest')
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    count = 0
+    for frame in pd.read_csv(args.input, chunksize=args.chunk_size, dtype={'userid': str}):
+        result = ingest_users(frame, args.data_dir)
+        count += result.rows
+        steps = ', '.join(f"{step} {1000 * seconds:.1f} ms" for step, seconds in result.timings.items())
+        print(f"Generation {result.generation}: {result.rows} users added, {result.users} stored ({steps})")
+    elapsed = time.perf_counter() - began
+    print(f"Ingested {count} users in {elapsed:.2f} s ({count / max(elapsed, 1e-9):,.0f} users/s)")
+
+
+if __name__ == '__main__':
+    main()
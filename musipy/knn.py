@@ -0,0 +1,248 @@
+"""Compact, library-independent KNN regression model
+
+The pickled KNeighborsRegressor only works with the scikit-learn version
+that wrote it. Serving it needs no more than the training traits, the
+training ratings and three settings, so those are written to one file:
+
+    b'MUSIPY-KNN\\n'                 magic
+    8-byte little-endian length     then that many bytes of JSON header
+    raw arrays                      C order, 64-byte aligned
+
+The data section starts at the first 64-byte boundary after the header.
+The header holds format_version, the model settings and, for each array,
+its dtype, shape and offset into the data section. Any language that reads JSON can read the
+file; NumPy memory-maps the arrays straight out of it, so loading takes
+milliseconds and every worker shares the pages.
+
+Convert an existing pickle or fit from the CSV with:
+
+    python -m musipy.knn --from-pickle models/knn.pkl
+    python -m musipy.knn --data data/big5_music_fixed.csv
+"""
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from .distance import TRAIT_COLUMNS
+from .paths import DATA_DIR, MODELS_DIR
+from .sparse import SparseRatings
+from .topk import top_k
+
+FORMAT_VERSION = 1
+MAGIC = b'MUSIPY-KNN\n'
+ALIGNMENT = 64
+MODEL_PATH = os.path.join(MODELS_DIR, 'knn.bin')
+TARGET_COLUMNS = [f'q{i}' for i in range(1, 51)]
+
+
+class KNNModel:
+    """Euclidean k-nearest-neighbors regressor matching KNeighborsRegressor
+
+    predict() reproduces KNeighborsRegressor(weights='uniform' or 'distance')
+    with the default Minkowski p=2 metric. Neighbors tied at the k-th
+    distance may be picked differently, which only matters when they have
+    different targets.
+
+    The targets may be SparseRatings (musipy.sparse). Each song's prediction
+    then averages only the neighbors who rated it, and is NaN if none did.
+    Such a model is kept in memory; save() only writes dense targets.
+    """
+
+    def __init__(self, X, y, n_neighbors=5, weights='uniform',
+                 feature_columns=TRAIT_COLUMNS, target_columns=TARGET_COLUMNS):
+        if weights not in ('uniform', 'distance'):
+            raise ValueError(f"unsupported weights {weights!r}")
+        self.X = np.asarray(X)
+        self.y = y if isinstance(y, SparseRatings) else np.asarray(y)
+        self.n_neighbors = int(n_neighbors)
+        self.weights = weights
+        self.feature_columns = list(feature_columns)
+        self.target_columns = list(target_columns)
+
+    @classmethod
+    def from_estimator(cls, estimator, feature_columns=TRAIT_COLUMNS, target_columns=TARGET_COLUMNS):
+        """Copy the arrays out of a fitted scikit-learn KNeighborsRegressor"""
+        if estimator.effective_metric_ != 'euclidean' or not isinstance(estimator.weights, str):
+            raise ValueError("only euclidean models with 'uniform' or 'distance' weights can be converted")
+        y = np.asarray(estimator._y)
+        if np.issubdtype(y.dtype, np.integer) and y.size and y.min() >= 0 and y.max() <= 255:
+            y = y.astype(np.uint8)
+        return cls(np.asarray(estimator._fit_X, dtype=np.float64), y,
+                   estimator.n_neighbors, estimator.weights, feature_columns, target_columns)
+
+    def __len__(self):
+        return len(self.X)
+
+    def save(self, path=MODEL_PATH):
+        if isinstance(self.y, SparseRatings):
+            raise ValueError("sparse targets are saved with SparseRatings.save(), not in the model file")
+        arrays = {'X': np.ascontiguousarray(self.X), 'y': np.ascontiguousarray(self.y)}
+        header = {'format_version': FORMAT_VERSION, 'n_neighbors': self.n_neighbors,
+                  'weights': self.weights, 'metric': 'euclidean',
+                  'feature_columns': self.feature_columns, 'target_columns': self.target_columns,
+                  'arrays': {}}
+        offset = 0
+        for name, values in arrays.items():
+            header['arrays'][name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+            offset = _align(offset + values.nbytes)
+        header_bytes = json.dumps(header).encode()
+        data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for name, values in arrays.items():
+                f.seek(data_start + header['arrays'][name]['offset'])
+                f.write(values.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, mmap_mode='r'):
+        """Read a model file; with mmap_mode the arrays are mapped, not copied"""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a musipy KNN model")
+            (length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length))
+        data_start = _align(len(MAGIC) + 8 + length)
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"unsupported KNN model format {header['format_version']}")
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            if mmap_mode:
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=data_start + spec['offset'], shape=shape)
+            else:
+                with open(path, 'rb') as f:
+                    f.seek(data_start + spec['offset'])
+                    arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        return cls(arrays['X'], arrays['y'], header['n_neighbors'], header['weights'],
+                   header['feature_columns'], header['target_columns'])
+
+    def kneighbors(self, queries, n_neighbors=None):
+        """Distances and positions of the nearest training rows, nearest first"""
+        queries = _as_queries(queries, self.X.shape[1])
+        distances = _euclidean(queries, self.X)
+        indices = top_k(distances, n_neighbors or self.n_neighbors)
+        return np.take_along_axis(distances, indices, axis=1), indices
+
+    def predict(self, queries, chunk_size=64):
+        """Predicted ratings, one row of len(target_columns) per query"""
+        queries = _as_queries(queries, self.X.shape[1])
+        k = min(self.n_neighbors, len(self.X))
+        predictions = np.empty((len(queries), self.y.shape[1]))
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            distances = _euclidean(chunk, self.X)
+            # The neighbors' order does not affect the average, so no sort
+            indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            weights = _weights(np.take_along_axis(distances, indices, axis=1), self.weights)
+            if isinstance(self.y, SparseRatings):
+                predictions[start:start + len(chunk)] = _sparse_predictions(self.y, indices, weights)
+                continue
+
+            # Scatter the weights into a dense row per query and let one
+            # matrix product do the weighted sums over the targets
+            dense = np.zeros_like(distances)
+            np.put_along_axis(dense, indices, weights, axis=1)
+            predictions[start:start + len(chunk)] = (dense @ self.y) / weights.sum(axis=1, keepdims=True)
+        return predictions
+
+
+def _sparse_predictions(y, indices, weights):
+    # One sparse (queries x users) weight matrix times the ratings, and
+    # times the rated mask for each song's sum of weights
+    from scipy.sparse import csr_matrix
+
+    weight_matrix = csr_matrix((weights.ravel(), indices.ravel(), np.arange(0, indices.size + 1, indices.shape[1])),
+                               shape=(len(indices), len(y)))
+    totals = (weight_matrix @ y.csr).toarray()
+    norms = (weight_matrix @ y.rated_csr).toarray()
+    return np.divide(totals, norms, out=np.full(totals.shape, np.nan), where=norms > 0)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _as_queries(queries, n_features):
+    if hasattr(queries, 'keys'):
+        queries = [[queries[column] for column in TRAIT_COLUMNS]]
+    return np.asarray(queries, dtype=np.float64).reshape(-1, n_features)
+
+
+def _euclidean(queries, X):
+    # Differences rather than the |a|^2 - 2ab + |b|^2 expansion, so exact
+    # matches come out as exactly 0 for the 'distance' weighting below
+    squared = np.zeros((len(queries), len(X)))
+    for column in range(X.shape[1]):
+        squared += np.square(X[:, column] - queries[:, column, None])
+    return np.sqrt(squared, out=squared)
+
+
+def _weights(distances, weights):
+    if weights == 'uniform':
+        return np.ones_like(distances)
+    # As scikit-learn: weight 1/d, except that a query matching training
+    # rows exactly takes only those rows, with equal weight
+    with np.errstate(divide='ignore'):
+        inverse = 1.0 / distances
+    exact = np.isinf(inverse)
+    exact_rows = exact.any(axis=1)
+    inverse[exact_rows] = exact[exact_rows]
+    return inverse
+
+
+def fit_from_csv(path=os.path.join(DATA_DIR, 'big5_music_fixed.csv'), n_neighbors=2000, weights='distance'):
+    """The model create_model_pickle.py trains, without scikit-learn"""
+    import pandas as pd
+
+    big5music = pd.read_csv(path)
+    y = big5music[TARGET_COLUMNS].to_numpy()
+    return KNNModel(big5music[TRAIT_COLUMNS].to_numpy(dtype=np.float64),
+                    y.astype(np.uint8) if y.min() >= 0 and y.max() <= 255 else y,
+                    n_neighbors, weights)
+
+
+def load_model(path=MODEL_PATH, pickle_path=None):
+    """Load the compact model, converting a legacy pickle if that is all there is"""
+    try:
+        return KNNModel.load(path)
+    except FileNotFoundError:
+        if pickle_path is None or not os.path.exists(pickle_path):
+            raise
+    import joblib
+
+    print(f"Compact model not found, converting {pickle_path}.")
+    return KNNModel.from_estimator(joblib.load(pickle_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the compact KNN model file.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--from-pickle', help='convert a pickled KNeighborsRegressor')
+    source.add_argument('--data', default=os.path.join(DATA_DIR, 'big5_music_fixed.csv'),
+                        help='fit from the ratings CSV (the default)')
+    parser.add_argument('--output', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.from_pickle:
+        import joblib
+        model = KNNModel.from_estimator(joblib.load(args.from_pickle))
+    else:
+        model = fit_from_csv(args.data)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    model.save(args.output)
+    print(f"Wrote {len(model)} x {model.X.shape[1]} model (k={model.n_neighbors}, "
+          f"weights={model.weights}) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Per-process memory accounting from /proc (Linux only)
+
+RSS counts shared pages in full in every process that maps them, so it
+overstates what memory-mapped data costs. PSS splits each shared page
+between the processes using it and USS counts only private pages; summed
+over the workers, PSS is the memory they really take.
+"""
+
+
+def memory_usage(pid='self'):
+    """RSS, PSS and USS of a process in MiB, or {} where /proc is unavailable"""
+    usage = {}
+    kib = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                # e.g. "Pss:    428 kB"; the first line is the address range
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    kib[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return usage
+    usage['rss'] = kib.get('Rss', 0) / 1024
+    usage['pss'] = kib.get('Pss', 0) / 1024
+    usage['uss'] = (kib.get('Private_Clean', 0) + kib.get('Private_Dirty', 0)) / 1024
+    return usage
+
+
+def format_usage(usage):
+    return ', '.join(f"{name.upper()} {value:.1f} MiB" for name, value in usage.items()) or 'unavailable'
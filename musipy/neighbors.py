@@ -0,0 +1,122 @@
+"""Precomputed song-to-song neighbor index
+
+The song cosine matrix never changes while the app runs, so the nearest
+songs for every song are computed once and stored in a small .npz file.
+The file records the SHA-1 of the CSV it was built from and is rebuilt
+when that no longer matches.
+
+The app does not load it: Engine.similar_songs() scores seeds against the
+whole cosine matrix (musipy.similarity). It is kept for offline lookups.
+
+Build it with:
+
+    python -m musipy.neighbors
+"""
+import argparse
+import os
+
+import numpy as np
+
+from .paths import SONG_COSINES_PATH, SONG_NEIGHBORS_PATH, file_digest
+from .topk import top_k
+
+# Bump when the layout of the .npz file changes
+FORMAT_VERSION = 1
+DEFAULT_NEIGHBORS = 10
+
+
+class SongNeighbors:
+    """Top-N neighbor positions and cosine scores for every song"""
+
+    def __init__(self, titles, indices, scores, source_sha1=''):
+        self.titles = np.asarray(titles, dtype=str)
+        self.indices = np.asarray(indices)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.source_sha1 = str(source_sha1)
+        self.positions = {title: i for i, title in enumerate(self.titles)}
+
+    @classmethod
+    def from_cosines(cls, song_cosines, n_neighbors=DEFAULT_NEIGHBORS, source_sha1=''):
+        """Rank every column of the cosine matrix, skipping the song itself"""
+        cosines = song_cosines.to_numpy(dtype=np.float64, copy=True)
+        np.fill_diagonal(cosines, -np.inf)
+        indices = top_k(cosines.T, n_neighbors, largest=True)
+        scores = np.take_along_axis(cosines.T, indices, axis=1)
+        return cls(song_cosines.columns, indices.astype(np.int32), scores, source_sha1)
+
+    @classmethod
+    def from_csv(cls, path=SONG_COSINES_PATH, n_neighbors=DEFAULT_NEIGHBORS):
+        import pandas as pd
+
+        return cls.from_cosines(pd.read_csv(path), n_neighbors, file_digest(path))
+
+    @classmethod
+    def load(cls, path=SONG_NEIGHBORS_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"unsupported song neighbor format {int(data['format_version'])}")
+            return cls(data['titles'], data['indices'], data['scores'], data['source_sha1'])
+
+    def save(self, path=SONG_NEIGHBORS_PATH):
+        # Write through the open file so numpy does not append a second .npz,
+        # next to the target so a worker loading it never sees half a file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, format_version=FORMAT_VERSION, source_sha1=self.source_sha1,
+                     titles=self.titles, indices=self.indices, scores=self.scores)
+        os.replace(tmp_path, path)
+
+    @property
+    def n_neighbors(self):
+        return self.indices.shape[1]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def neighbors(self, title, n=5):
+        """Positions of the n songs most similar to the title, best first"""
+        return self.indices[self.positions[title], :n]
+
+    def scored_neighbors(self, title, n=5):
+        """Positions and cosine similarities of the n songs most similar to the title"""
+        row = self.positions[title]
+        return self.indices[row, :n], self.scores[row, :n]
+
+
+def load_song_neighbors(path=SONG_NEIGHBORS_PATH, cosines_path=SONG_COSINES_PATH,
+                        n_neighbors=DEFAULT_NEIGHBORS):
+    """Load the index, rebuilding it if it is missing or built from another CSV"""
+    source_sha1 = file_digest(cosines_path)
+    try:
+        index = SongNeighbors.load(path)
+        if index.source_sha1 == source_sha1 and index.n_neighbors >= n_neighbors:
+            return index
+        print("Song neighbor index is stale, rebuilding.")
+    except FileNotFoundError:
+        print("Song neighbor index not found, building it.")
+    except (ValueError, KeyError) as e:
+        print(f"Song neighbor index unreadable ({e}), rebuilding.")
+
+    index = SongNeighbors.from_csv(cosines_path, n_neighbors)
+    try:
+        index.save(path)
+    except OSError as e:
+        # A read-only data directory still gets a working in-memory index
+        print(f"Could not save song neighbor index: {e}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the song neighbor index.')
+    parser.add_argument('--cosines', default=SONG_COSINES_PATH)
+    parser.add_argument('--output', default=SONG_NEIGHBORS_PATH)
+    parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBORS)
+    args = parser.parse_args()
+
+    index = SongNeighbors.from_csv(args.cosines, args.neighbors)
+    index.save(args.output)
+    print(f"Wrote {len(index)} songs x {index.n_neighbors} neighbors to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+# Repository layout shared by the Flask app, the Streamlit apps and the tools
+BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
+FINAL_PATH = os.path.join(DATA_DIR, 'final.csv')
+SONG_NAMES_PATH = os.path.join(DATA_DIR, 'songs_names.csv')
+SONG_COSINES_PATH = os.path.join(DATA_DIR, 'song_cosines.csv')
+SONG_NEIGHBORS_PATH = os.path.join(DATA_DIR, 'song_neighbors.npz')
+
+
+# Path -> ((inode, size, mtime), digest) of files already hashed by this process
+_digests = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents, used to tie built artifacts to their source
+
+    A file is only read again once its inode, size or modification time
+    changed, so checking every store block against the same CSV hashes it
+    once.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    _digests[path] = (stamp, digest.hexdigest())
+    return digest.hexdigest()
@@ -0,0 +1,92 @@
+"""Bounded thread pool for CPU-bound scoring under threaded servers
+
+NumPy releases the GIL inside the matrix products and selections that
+dominate scoring, so a few threads keep several cores busy. The pool caps
+how much work may wait: once max_workers jobs are running and max_queue
+more are waiting, run() fails fast with PoolBusy instead of letting the
+backlog (and every client's latency) grow. A job not finished within the
+timeout raises PoolTimeout; it still runs to completion in the
+background, and its slot is only freed then.
+
+Threads do not survive fork(), so each process starts its own executor on
+first use. A pool preloaded in the gunicorn master is still safe to use
+in the workers.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class PoolBusy(RuntimeError):
+    """Every worker thread is busy and the queue is full"""
+
+
+class PoolTimeout(RuntimeError):
+    """A job did not finish within the pool's timeout"""
+
+
+class ComputePool:
+    """Run callables on at most max_workers threads with at most max_queue waiting
+
+    With max_workers=0 jobs run inline in the caller's thread, as they
+    would without a pool; max_queue and timeout then do not apply.
+    """
+
+    def __init__(self, max_workers=None, max_queue=32, timeout=None):
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='musipy-compute')
+                self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+                self._pending = 0
+                self._pid = os.getpid()
+            return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def submit(self, func, *args, **kwargs):
+        """Future for func(*args, **kwargs); raises PoolBusy when the queue is full"""
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy(f"{self.max_workers} jobs running and {self.max_queue} queued")
+        with self._lock:
+            self._pending += 1
+        future = executor.submit(func, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """func(*args, **kwargs) on the pool, waiting at most timeout seconds"""
+        if self.max_workers == 0:
+            return func(*args, **kwargs)
+        future = self.submit(func, *args, **kwargs)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise PoolTimeout(f"Job did not finish within {self.timeout} s") from None
+
+    def stats(self):
+        return {'max_workers': self.max_workers, 'max_queue': self.max_queue, 'timeout': self.timeout,
+                'pending': self._pending, 'completed': self.completed, 'rejected': self.rejected,
+                'timed_out': self.timed_out}
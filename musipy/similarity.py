@@ -0,0 +1,220 @@
+"""Song-to-song cosine similarity computed from the users' ratings
+
+The cosine of songs i and j is G[i, j] / sqrt(G[i, i] G[j, j]), where
+G = R^T R is the Gram matrix of the (users x songs) rating matrix R. G is
+a sum over users, so SongCosines keeps it as a running accumulator: a batch
+of new ratings adds its own R^T R, and the matrix is renormalised from G
+in O(songs^2), without revisiting earlier users. The diagonal of G holds
+the squared column norms.
+
+Ratings are read in row blocks, so the users never need to fit in memory
+at once, and sparse ratings (scipy.sparse or musipy.sparse.SparseRatings)
+are multiplied one block of song columns at a time, so mostly unrated
+catalogs only pay for the ratings they have. A missing rating (NaN
+or an absent sparse entry) contributes nothing, as a 0 does. For catalogs
+of thousands of songs, neighbors() ranks each song's most similar songs
+one block of columns at a time instead of normalising the whole matrix.
+
+similar_to_seeds() ranks songs against several liked (and disliked) songs
+at once: their cosine rows are weighted and summed in one reduction, so a
+listener who likes twenty songs costs one top-k, not twenty.
+
+Regenerate data/song_cosines.csv from big5_music_fixed.csv with:
+
+    python -m musipy.similarity --check
+"""
+import argparse
+import csv
+import io
+import os
+
+import numpy as np
+
+from .paths import DATA_DIR, SONG_COSINES_PATH, SONG_NAMES_PATH
+from .aggregate import SongRanking
+from .topk import top_k
+
+# Bump when the layout of the saved accumulator changes
+FORMAT_VERSION = 1
+# How much a disliked song's similarity counts against a liked song's
+DEFAULT_DISLIKE_WEIGHT = 0.5
+RATINGS_PATH = os.path.join(DATA_DIR, 'big5_music_fixed.csv')
+
+
+class SongCosines:
+    """Running Gram matrix of the ratings, and the song-song cosines it gives"""
+
+    def __init__(self, gram, users=0):
+        self.gram = gram
+        self.users = users
+
+    @classmethod
+    def empty(cls, n_songs, dtype=np.float64):
+        return cls(np.zeros((n_songs, n_songs), dtype=dtype))
+
+    @classmethod
+    def from_cosines(cls, cosines, norms, users=0):
+        """Accumulator that reproduces a published cosine matrix, given the column norms it was built with"""
+        norms = np.asarray(norms, dtype=np.float64)
+        return cls(np.asarray(cosines, dtype=np.float64) * np.outer(norms, norms), users)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"unsupported song cosine format {int(data['format_version'])}")
+            return cls(data['gram'], int(data['users']))
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, format_version=FORMAT_VERSION, users=self.users, gram=self.gram)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.gram)
+
+    def add(self, ratings, chunk_size=65536, block_size=1024):
+        """Add a (users x songs) batch of ratings, dense, scipy.sparse or SparseRatings; returns self"""
+        if hasattr(ratings, 'csc') or hasattr(ratings, 'tocsc'):
+            # Sparse: one block of songs' columns of R^T R at a time, so only
+            # a (songs x block_size) slice is ever dense besides the result
+            columns = (ratings.csc if hasattr(ratings, 'csc') else ratings.tocsc()).astype(self.gram.dtype)
+            transposed = columns.T.tocsr()
+            for start in range(0, columns.shape[1], block_size):
+                self.gram[:, start:start + block_size] += (transposed @ columns[:, start:start + block_size]).toarray()
+        else:
+            for start in range(0, len(ratings), chunk_size):
+                block = np.nan_to_num(np.asarray(ratings[start:start + chunk_size], dtype=self.gram.dtype))
+                self.gram += block.T @ block
+        self.users += ratings.shape[0]
+        return self
+
+    @property
+    def norms(self):
+        """Euclidean norm of every song's rating column"""
+        return np.sqrt(np.diag(self.gram))
+
+    def cosines(self, columns=slice(None)):
+        """(songs x selected columns) cosine matrix; songs nobody rated get 0, and 1 with themselves"""
+        norms = self.norms
+        scale = np.outer(norms, norms[columns])
+        cosines = np.divide(self.gram[:, columns], scale, out=np.zeros(scale.shape), where=scale > 0)
+        rows = np.arange(len(norms))[columns]
+        cosines[rows, np.arange(len(rows))] = 1
+        return cosines
+
+    def neighbors(self, n_neighbors, block_size=1024):
+        """(songs, n) positions and cosines of every song's most similar other songs, best first"""
+        n_neighbors = min(n_neighbors, len(self) - 1)
+        indices = np.empty((len(self), n_neighbors), dtype=np.int32)
+        scores = np.empty((len(self), n_neighbors), dtype=np.float32)
+        for start in range(0, len(self), block_size):
+            columns = slice(start, min(start + block_size, len(self)))
+            block = self.cosines(columns).T
+            block[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+            nearest = top_k(block, n_neighbors, largest=True)
+            indices[columns] = nearest
+            scores[columns] = np.take_along_axis(block, nearest, axis=1)
+        return indices, scores
+
+    def to_frame(self, columns, index=None):
+        """The cosines as the song_cosines DataFrame: song titles as columns, q1..q50 as the index"""
+        import pandas as pd
+
+        index = [f'q{i + 1}' for i in range(len(self))] if index is None else index
+        return pd.DataFrame(self.cosines(), columns=list(columns), index=list(index))
+
+
+def seed_weights(liked, disliked=(), dislike_weight=DEFAULT_DISLIKE_WEIGHT):
+    """Seed song ids and their weights: liked songs share +1, disliked ones -dislike_weight"""
+    liked = np.unique(np.asarray(liked, dtype=np.intp))
+    disliked = np.setdiff1d(np.asarray(disliked, dtype=np.intp), liked)
+    weights = np.concatenate([np.full(len(liked), 1 / max(1, len(liked))),
+                              np.full(len(disliked), -dislike_weight / max(1, len(disliked)))])
+    return np.concatenate([liked, disliked]), weights
+
+
+def similar_to_seeds(cosines, liked, disliked=(), n_songs=10, dislike_weight=DEFAULT_DISLIKE_WEIGHT):
+    """Top n_songs song ids for a set of liked and disliked song ids, with their scores, best first
+
+    A song's score is its mean cosine to the liked songs minus
+    dislike_weight times its mean cosine to the disliked ones. Liked and
+    disliked songs are left out. cosines is the (songs x songs) matrix; only
+    the seeds' rows are read.
+    """
+    seeds, weights = seed_weights(liked, disliked, dislike_weight)
+    scores = weights @ np.asarray(cosines[seeds], dtype=np.float64)
+    scores[seeds] = np.nan
+    indices = top_k(scores, min(n_songs, len(scores) - len(seeds)), largest=True)
+    return SongRanking(indices, scores[indices])
+
+
+def read_ratings(path=RATINGS_PATH, columns=None, chunk_size=65536):
+    """(users x songs) float blocks of a ratings CSV's q1..qN columns, chunk_size users at a time"""
+    import pandas as pd
+
+    for frame in pd.read_csv(path, chunksize=chunk_size):
+        if columns is None:
+            columns = sorted((c for c in frame.columns if c[:1] == 'q' and c[1:].isdigit()), key=lambda c: int(c[1:]))
+        yield frame[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def cosines_csv(cosines, columns, labels):
+    """song_cosines.csv bytes: a header of titles, then a q label and 9 digits per cell on each line"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\r\n')
+    writer.writerow(columns)
+    writer.writerows([label] + ['%.9g' % value for value in row] for label, row in zip(labels, cosines))
+    return out.getvalue().rstrip('\r\n').encode('utf-8')
+
+
+def song_labels(n_songs, cosines_path=SONG_COSINES_PATH, names_path=SONG_NAMES_PATH):
+    """Column titles for the matrix: those of the current song_cosines.csv, else songs_names.csv's"""
+    import pandas as pd
+
+    for path, column in ((cosines_path, None), (names_path, 'Title')):
+        try:
+            frame = pd.read_csv(path, nrows=0 if column is None else None, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        titles = list(frame.columns) if column is None else frame[column].tolist()
+        if len(titles) == n_songs:
+            return titles
+    return [f'q{i + 1}' for i in range(n_songs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute the song-song cosine matrix from the ratings.')
+    parser.add_argument('--input', default=RATINGS_PATH, help='CSV with rating columns q1..qN')
+    parser.add_argument('--output', default=SONG_COSINES_PATH)
+    parser.add_argument('--state', default=None,
+                        help='accumulator .npz: the input is added to it if it exists, and it is saved back')
+    parser.add_argument('--check', action='store_true', help='compare with the current output file first')
+    args = parser.parse_args()
+
+    accumulator = None
+    if args.state and os.path.exists(args.state):
+        accumulator = SongCosines.load(args.state)
+    for ratings in read_ratings(args.input):
+        if accumulator is None:
+            accumulator = SongCosines.empty(ratings.shape[1])
+        accumulator.add(ratings)
+    cosines = accumulator.cosines()
+
+    labels = song_labels(len(accumulator), args.output)
+    if args.check and os.path.exists(args.output):
+        import pandas as pd
+
+        difference = np.abs(pd.read_csv(args.output).to_numpy(dtype=np.float64) - cosines).max()
+        print(f"Largest difference from {args.output}: {difference:.3g}")
+    with open(args.output + '.tmp', 'wb') as f:
+        f.write(cosines_csv(cosines, labels, [f'q{i + 1}' for i in range(len(accumulator))]))
+    os.replace(args.output + '.tmp', args.output)
+    if args.state:
+        accumulator.save(args.state)
+    print(f"Wrote {len(accumulator)} x {len(accumulator)} cosines from {accumulator.users} users to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
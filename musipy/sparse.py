@@ -0,0 +1,156 @@
+"""Users x songs ratings that store only the rated cells
+
+The shipped ratings are a dense 21k x 50 table, but a catalog of thousands
+of songs leaves almost every cell unrated. SparseRatings keeps the rated
+cells in CSR order (one run of song positions and ratings per user) and
+builds the CSC order (one run of users per song) the first time it is
+asked for.
+
+Missing and zero are different things here: every stored entry is a
+rating, including an explicit 0, and an absent entry means the user never
+rated the song. rated(rows) gives the mask that tells them apart, which
+musipy.aggregate and KNNModel take so unrated songs neither count nor drag
+a mean down. Indexing with user positions, ratings[indices], returns those
+users' rows as a dense block with unrated cells as 0, so code written for
+the dense dataset.ratings works unchanged.
+
+The arrays are saved as .npy blocks, like the binary store, and load
+memory-mapped:
+
+    ratings = SparseRatings.from_dense(dense, missing=0)
+    ratings.save(directory, 'users.ratings')
+    ratings = SparseRatings.load(directory, 'users.ratings')
+"""
+import os
+from functools import cached_property
+
+import numpy as np
+
+# Stored arrays of a SparseRatings, as <prefix>.<name>.npy
+BLOCKS = ('data', 'indices', 'indptr', 'shape')
+
+
+class SparseRatings:
+    """CSR ratings: a user's song positions are indices[indptr[u]:indptr[u + 1]], sorted, with their data"""
+
+    def __init__(self, data, indices, indptr, n_songs):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.n_songs = int(n_songs)
+
+    @classmethod
+    def from_dense(cls, ratings, missing=0):
+        """Store the cells of a dense matrix that are not `missing` (None: keep every non-NaN cell)"""
+        ratings = np.asarray(ratings)
+        if missing is None:
+            stored = ~np.isnan(ratings) if ratings.dtype.kind == 'f' else np.ones(ratings.shape, dtype=bool)
+        else:
+            stored = ratings != missing
+        users, songs = np.nonzero(stored)
+        indptr = np.zeros(len(ratings) + 1, dtype=np.int64)
+        np.cumsum(stored.sum(axis=1), out=indptr[1:])
+        return cls(ratings[users, songs], songs.astype(np.int32), indptr, ratings.shape[1])
+
+    @classmethod
+    def from_triples(cls, users, songs, values, shape):
+        """Ratings from (user, song, rating) triples in any order; ValueError if a cell is rated twice"""
+        users, songs = np.asarray(users, dtype=np.int64), np.asarray(songs, dtype=np.int64)
+        # One key per cell sorts by user, then song; already sorted input sorts in linear time
+        keys = users * shape[1] + songs
+        order = np.argsort(keys, kind='stable')
+        keys, users, songs, values = keys[order], users[order], songs[order], np.asarray(values)[order]
+        if (keys[1:] == keys[:-1]).any():
+            raise ValueError("A user rated the same song more than once")
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(users, minlength=shape[0]), out=indptr[1:])
+        return cls(values, songs.astype(np.int32), indptr, shape[1])
+
+    @classmethod
+    def load(cls, directory, prefix, mmap_mode='r'):
+        arrays = {name: np.load(os.path.join(directory, f'{prefix}.{name}.npy'), mmap_mode=mmap_mode,
+                                allow_pickle=False) for name in BLOCKS}
+        return cls(arrays['data'], arrays['indices'], arrays['indptr'], arrays['shape'][1])
+
+    def save(self, directory, prefix):
+        arrays = {'data': self.data, 'indices': self.indices, 'indptr': self.indptr,
+                  'shape': np.array(self.shape, dtype=np.int64)}
+        for name in BLOCKS:
+            path = os.path.join(directory, f'{prefix}.{name}.npy')
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, arrays[name], allow_pickle=False)
+            os.replace(path + '.tmp', path)
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, self.n_songs
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def density(self):
+        return self.nnz / max(1, self.shape[0] * self.shape[1])
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @cached_property
+    def csr(self):
+        """scipy.sparse CSR matrix over the same arrays"""
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    @cached_property
+    def csc(self):
+        """scipy.sparse CSC matrix: each song's users and ratings, for column-wise work"""
+        return self.csr.tocsc()
+
+    @cached_property
+    def rated_csr(self):
+        """CSR matrix of 1s where a rating is stored, explicit zeros included"""
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((np.ones(self.nnz, dtype=np.float64), self.indices, self.indptr), shape=self.shape)
+
+    def song_counts(self):
+        """Number of users who rated each song"""
+        return np.bincount(self.indices, minlength=self.n_songs)
+
+    def _gather(self, rows):
+        # Positions of the selected users' entries, and which selected row each is in
+        rows = np.asarray(rows, dtype=np.intp).ravel()
+        starts, lengths = self.indptr[rows], self.indptr[rows + 1] - self.indptr[rows]
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return owner, positions
+
+    def __getitem__(self, rows):
+        """Dense ratings of the users at these positions, any shape; unrated cells are 0"""
+        shape = np.shape(rows)
+        owner, positions = self._gather(rows)
+        block = np.zeros((int(np.prod(shape, dtype=np.int64)), self.n_songs), dtype=self.data.dtype)
+        block[owner, self.indices[positions]] = self.data[positions]
+        return block.reshape(shape + (self.n_songs,))
+
+    def rated(self, rows):
+        """Mask of the cells of ratings[rows] that hold a rating"""
+        shape = np.shape(rows)
+        owner, positions = self._gather(rows)
+        mask = np.zeros((int(np.prod(shape, dtype=np.int64)), self.n_songs), dtype=bool)
+        mask[owner, self.indices[positions]] = True
+        return mask.reshape(shape + (self.n_songs,))
+
+    def to_dense(self):
+        """The whole matrix with unrated cells as 0"""
+        return self[np.arange(len(self))]
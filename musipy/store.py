@@ -0,0 +1,333 @@
+"""Typed binary copies of the CSV data files
+
+Every table is written as a handful of .npy blocks (one 2-D block per group
+of numeric columns, one 1-D block per text column) in a ``store`` directory
+next to the CSVs, described by a JSON schema header:
+
+    {"format_version": 1,
+     "tables": {"users": {"source": "final.csv", "source_sha1": "...",
+                          "columns": [...], "index": null,
+                          "blocks": [{"name": "traits", "file": "users.traits.npy",
+                                      "dtype": "float64", "columns": [...]}, ...]}}}
+
+The users table also gets derived blocks: ``traits_unit``, the trait rows
+scaled to unit length as float32, ready to be memory-mapped straight into
+a PersonalityMatrix, and ``ratings_data``, ``ratings_indices`` and
+``ratings_indptr``, the rated cells as musipy.sparse.SparseRatings. The table's
+``missing_value`` (MISSING_VALUES, 0 for final.csv's 1-9 ratings) marks an
+unrated song: those cells, and blank ones, are the missing value in the
+dense ``ratings`` block and absent from the sparse ones.
+
+musipy.ingest appends users to the blocks in place. The schema is the
+commit point: readers only see a table's first ``rows`` rows, so rows
+written past them stay invisible until the new schema replaces the old.
+Ingested users are not written back to the CSVs; the users table's
+``ingest_sha1`` tracks them, and rebuilding the store drops them.
+
+Loading a block is a single read (or mmap) with no parsing. The loaders
+return the same DataFrames pd.read_csv would (blank ratings aside, which
+come back as the missing value), and read the CSV instead
+whenever the store is missing or was built from a different CSV.
+
+Build or refresh the store with:
+
+    python -m musipy.store
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+# pandas is imported inside the functions that build DataFrames: the serving
+# path only maps blocks and should not pay for importing it
+from .distance import TRAIT_COLUMNS, normalize_rows
+from .paths import DATA_DIR, FINAL_PATH, SONG_COSINES_PATH, SONG_NAMES_PATH, file_digest
+from .sparse import SparseRatings
+
+FORMAT_VERSION = 4
+SCHEMA_NAME = 'schema.json'
+STORE_DIR = os.path.join(DATA_DIR, 'store')
+
+# Table name -> CSV file name, read_csv keyword arguments
+TABLES = {
+    'users': ('final.csv', {}),
+    'song_names': ('songs_names.csv', {'encoding': 'utf-8'}),
+    'song_cosines': ('song_cosines.csv', {}),
+}
+
+# Table name -> rating that marks an unrated song; blank cells are unrated too
+MISSING_VALUES = {'users': 0}
+
+
+def store_dir_for(csv_path):
+    """The store lives in a 'store' directory next to the CSV files"""
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), 'store')
+
+
+def _compact_dtype(values):
+    # Smallest integer type that holds the block; other dtypes are kept
+    if values.dtype.kind in 'iu' and values.size:
+        return np.promote_types(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+    return values.dtype
+
+
+def _table_blocks(table, frame):
+    """Group a table's columns into named blocks"""
+    if table == 'users':
+        song_columns = [c for c in frame.columns if c not in ['userid', 'country_of_residence'] + TRAIT_COLUMNS]
+        return [('userid', ['userid']), ('traits', TRAIT_COLUMNS),
+                ('country_of_residence', ['country_of_residence']), ('ratings', song_columns)]
+    if table == 'song_cosines':
+        return [('cosines', list(frame.columns))]
+    return [(column, [column]) for column in frame.columns]
+
+
+def _write_array(path, values):
+    # Write next to the target and swap it in so readers never see half a file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def write_table(store_dir, table, frame, source_path):
+    """Write one DataFrame as .npy blocks and return its schema entry"""
+    import pandas as pd
+
+    blocks = []
+    for name, columns in _table_blocks(table, frame):
+        block = frame[columns]
+        if len(columns) == 1 and not pd.api.types.is_numeric_dtype(block.dtypes.iloc[0]):
+            series = block.iloc[:, 0]
+            values = np.array(series.fillna('').astype(str).to_numpy(), dtype=str)
+            try:
+                # ASCII text takes a quarter of the space as bytes
+                values = values.astype(np.bytes_)
+            except UnicodeEncodeError:
+                pass
+            entry = {'dtype': 'str', 'nullable': bool(series.isna().any())}
+        else:
+            values = block.to_numpy()
+            entry = {'dtype': str(values.dtype)}
+            if table == 'users' and name == 'ratings' and values.dtype.kind == 'f':
+                # Blank cells are unrated, stored as the missing value
+                values = np.nan_to_num(values, nan=MISSING_VALUES[table])
+                if (values == np.round(values)).all():
+                    values = values.astype(np.int64)
+                    entry['dtype'] = 'int64'
+            values = np.ascontiguousarray(values, dtype=_compact_dtype(values))
+        file_name = f'{table}.{name}.npy'
+        _write_array(os.path.join(store_dir, file_name), values)
+        blocks.append(dict(entry, name=name, file=file_name, stored_dtype=str(values.dtype), columns=columns))
+
+    if table == 'users':
+        # Derived blocks are only read through load_block(), never load_table()
+        file_name = f'{table}.traits_unit.npy'
+        _write_array(os.path.join(store_dir, file_name), normalize_rows(frame[TRAIT_COLUMNS].to_numpy()))
+        blocks.append({'name': 'traits_unit', 'file': file_name, 'dtype': 'float32',
+                       'stored_dtype': 'float32', 'columns': TRAIT_COLUMNS, 'derived': True})
+
+        # The rated cells of the ratings in CSR order (see musipy.sparse). They
+        # have their own row counts: entries for data and indices, users + 1
+        # for indptr
+        ratings = next(block for block in blocks if block['name'] == 'ratings')
+        missing = MISSING_VALUES[table]
+        dense = np.nan_to_num(frame[ratings['columns']].to_numpy(dtype=np.float64), nan=missing)
+        sparse = SparseRatings.from_dense(dense, missing=missing)
+        for part, values in sparse_blocks(sparse, ratings['stored_dtype']).items():
+            file_name = f'{table}.{part}.npy'
+            _write_array(os.path.join(store_dir, file_name), values)
+            blocks.append({'name': part, 'file': file_name, 'dtype': str(values.dtype),
+                           'stored_dtype': str(values.dtype), 'columns': ratings['columns'],
+                           'rows': len(values), 'derived': True})
+
+    index = None
+    if not isinstance(frame.index, pd.RangeIndex):
+        index = f'{table}.index.npy'
+        _write_array(os.path.join(store_dir, index), np.array(frame.index.astype(str), dtype=str))
+
+    entry = {'source': os.path.basename(source_path), 'source_sha1': file_digest(source_path),
+             'rows': len(frame), 'columns': list(frame.columns), 'index': index, 'blocks': blocks}
+    if table in MISSING_VALUES:
+        entry['missing_value'] = MISSING_VALUES[table]
+    return entry
+
+
+def build_store(data_dir=DATA_DIR, store_dir=None):
+    """Convert every CSV in TABLES to the binary store"""
+    import pandas as pd
+
+    store_dir = store_dir or os.path.join(data_dir, 'store')
+    os.makedirs(store_dir, exist_ok=True)
+    previous = read_schema(store_dir)
+    schema = {'format_version': FORMAT_VERSION, 'tables': {}}
+    for table, (file_name, read_kwargs) in TABLES.items():
+        source_path = os.path.join(data_dir, file_name)
+        frame = pd.read_csv(source_path, **read_kwargs)
+        schema['tables'][table] = write_table(store_dir, table, frame, source_path)
+
+    if previous is not None and previous.get('generation'):
+        # Ingested users are only in the store (see musipy.ingest)
+        dropped = previous['tables']['users']['rows'] - schema['tables']['users']['rows']
+        print(f"Warning: the store held {dropped} ingested users that are not in the CSVs; they were dropped.")
+
+    # The schema goes last: it is what makes the new blocks visible
+    write_schema(store_dir, schema)
+    return schema
+
+
+def write_schema(store_dir, schema):
+    """Swap in a new schema header, which commits every block it lists"""
+    tmp_path = os.path.join(store_dir, SCHEMA_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(schema, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_dir, SCHEMA_NAME))
+
+
+def read_schema(store_dir=STORE_DIR):
+    """The store's schema header, or None if there is no usable store"""
+    try:
+        with open(os.path.join(store_dir, SCHEMA_NAME)) as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return None
+    if schema.get('format_version') != FORMAT_VERSION:
+        return None
+    return schema
+
+
+def table_schema(table, csv_path):
+    """Schema entry for a table if the store is present and matches the CSV
+
+    A store built from another version of the CSV is stale. If the CSV
+    itself is absent the store is trusted as is.
+    """
+    schema = read_schema(store_dir_for(csv_path))
+    if schema is None or table not in schema['tables']:
+        return None
+    entry = schema['tables'][table]
+    if os.path.exists(csv_path) and file_digest(csv_path) != entry['source_sha1']:
+        return None
+    return entry
+
+
+def _read_block(store_dir, rows, file_name, mmap_mode=None):
+    # Rows past the committed count belong to an ingest still in progress
+    values = np.load(os.path.join(store_dir, file_name), mmap_mode=mmap_mode, allow_pickle=False)
+    return values[:rows] if len(values) > rows else values
+
+
+def load_block(table, name, csv_path, mmap_mode=None):
+    """Raw array of one block in its stored dtype, or None if unavailable"""
+    entry = table_schema(table, csv_path)
+    if entry is None:
+        return None
+    for block in entry['blocks']:
+        if block['name'] == name:
+            return _read_block(store_dir_for(csv_path), block.get('rows', entry['rows']), block['file'], mmap_mode)
+    return None
+
+
+def sparse_blocks(sparse, dtype):
+    """Block name -> array of the users' sparse ratings, data in the dense block's dtype"""
+    return {'ratings_data': sparse.data.astype(dtype), 'ratings_indices': sparse.indices,
+            'ratings_indptr': sparse.indptr}
+
+
+def load_sparse_ratings(csv_path=FINAL_PATH, mmap_mode=None):
+    """The users' rated cells as SparseRatings, or None if the store has no sparse blocks"""
+    entry = table_schema('users', csv_path)
+    if entry is None:
+        return None
+    blocks = {block['name']: block for block in entry['blocks']}
+    if not all(part in blocks for part in ('ratings_data', 'ratings_indices', 'ratings_indptr')):
+        return None
+    arrays = {part: _read_block(store_dir_for(csv_path), blocks[part]['rows'], blocks[part]['file'], mmap_mode)
+              for part in ('ratings_data', 'ratings_indices', 'ratings_indptr')}
+    return SparseRatings(arrays['ratings_data'], arrays['ratings_indices'], arrays['ratings_indptr'],
+                         len(blocks['ratings']['columns']))
+
+
+def load_columns(table, columns, csv_path):
+    """Dict of column name -> NumPy array, without building a DataFrame
+
+    Text columns come back as str arrays. Only when the store is missing or
+    stale does this fall back to load_table (and so to pandas).
+    """
+    entry = table_schema(table, csv_path)
+    blocks = {} if entry is None else {b['name']: b for b in entry['blocks']}
+    if not all(column in blocks for column in columns):
+        frame = load_table(table, csv_path)
+        return {column: frame[column].to_numpy() for column in columns}
+
+    result = {}
+    for column in columns:
+        values = _read_block(store_dir_for(csv_path), entry['rows'], blocks[column]['file'])
+        result[column] = values.astype(str) if blocks[column]['dtype'] == 'str' else values
+    return result
+
+
+def load_table(table, csv_path):
+    """DataFrame for a table, read from the store or, failing that, the CSV
+
+    frame.attrs['source_sha1'] identifies the CSV contents the frame holds.
+    """
+    import pandas as pd
+
+    entry = table_schema(table, csv_path)
+    if entry is None:
+        print(f"Binary store missing or stale for {os.path.basename(csv_path)}, reading CSV.")
+        frame = pd.read_csv(csv_path, **TABLES[table][1])
+        frame.attrs['source_sha1'] = file_digest(csv_path)
+        return frame
+
+    store_dir = store_dir_for(csv_path)
+    parts = []
+    for block in entry['blocks']:
+        if block.get('derived'):
+            continue
+        values = _read_block(store_dir, entry['rows'], block['file'])
+        if block['dtype'] == 'str':
+            series = pd.Series(values.astype(str), name=block['columns'][0])
+            if block['nullable']:
+                series = series.where(series != '')
+            parts.append(series.to_frame())
+        else:
+            parts.append(pd.DataFrame(values.astype(block['dtype'], copy=False), columns=block['columns']))
+
+    frame = pd.concat(parts, axis=1)[entry['columns']]
+    if entry['index'] is not None:
+        frame.index = _read_block(store_dir, entry['rows'], entry['index'])
+    frame.attrs['source_sha1'] = entry['source_sha1']
+    return frame
+
+
+def load_users(path=FINAL_PATH):
+    """The final.csv user table: userid, traits, country and 50 song ratings"""
+    return load_table('users', path)
+
+
+def load_song_names(path=SONG_NAMES_PATH):
+    """The songs_names.csv metadata: Variable, Artist, Title, Genre"""
+    return load_table('song_names', path)
+
+
+def load_song_cosines(path=SONG_COSINES_PATH):
+    """The 50 x 50 song_cosines.csv matrix, indexed by q1..q50"""
+    return load_table('song_cosines', path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the CSV data files to the binary store.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--store-dir', default=None, help="defaults to <data-dir>/store")
+    args = parser.parse_args()
+
+    schema = build_store(args.data_dir, args.store_dir)
+    for table, entry in schema['tables'].items():
+        print(f"{table}: {entry['rows']} rows, {len(entry['blocks'])} blocks from {entry['source']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Engine helpers shared by the Streamlit apps
+
+streamlit/streamlit_app.py and streamlit/streamlit_standalone.py differ in
+their pages but load and score the same way, through these functions.
+Imports streamlit, so only the Streamlit apps import this module.
+
+The engine and its tables are st.cache_resource (one per server process).
+Song lists are st.cache_data, shared by every session and keyed by the
+dataset version; each session's nearest users follow its own profile in
+st.session_state (see musipy.incremental).
+"""
+import numpy as np
+import streamlit as st
+
+from .aggregate import DEFAULT_PER_USER, DEFAULT_SONGS, DEFAULT_THRESHOLD
+from .distance import as_trait_vector
+from .engine import Engine
+from .incremental import IncrementalDistances
+
+
+@st.cache_resource
+def load_data():
+    """Load the model and data tables through the shared engine (see load_engine)
+
+    The model (models/knn.bin) is only built in the Docker image, so it may
+    be None; the recommendations do not need it.
+    """
+    try:
+        engine = load_engine()
+        tables = engine.estimator, engine.song_names, engine.song_cosines, engine.users
+        for table, name in zip(tables[1:], ['songs_names.csv', 'song_cosines.csv', 'final.csv']):
+            if table is None:
+                st.error(f"Data file not found: {name}")
+                return None, None, None, None
+        return tables
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None, None, None, None
+
+
+@st.cache_resource
+def load_engine():
+    """Recommendation engine (musipy.engine) shared by every session, configured like the Flask app"""
+    return Engine.from_env().load()
+
+
+@st.cache_resource(max_entries=1)
+def load_trait_columns(dataset_version):
+    """Column-major copy of the unit trait matrix for IncrementalDistances
+
+    Only the current dataset version's copy is kept: a refresh replaces it
+    rather than adding another one next to it.
+    """
+    return np.asfortranarray(load_engine().dataset.unit_traits)
+
+
+def session_nearest_users(engine, personality_scores, n_users):
+    """Nearest users from this session's distances, updated only for the traits that changed
+
+    The distances follow the session's last profile in st.session_state; a
+    profile that rounds the same costs nothing. Indexes other than brute
+    force are searched as usual.
+    """
+    if engine.user_index.name != 'brute':
+        return engine.nearest_users(personality_scores, n_users)
+    distances = st.session_state.get('user_distances')
+    columns = load_trait_columns(engine.version)
+    if distances is None or distances.unit is not columns:
+        distances = st.session_state.user_distances = IncrementalDistances(columns)
+    return distances.nearest(personality_scores, n_users)
+
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def cached_recommendations(dataset_version, user_indices, user_distances, threshold, per_user, n_songs):
+    """Song titles the nearest users' ratings pick, shared by every session
+
+    A pure function of its arguments: the nearest users are found per
+    session first, so a hit never skips updating a session's distances.
+    Keyed on the dataset version, so a rebuilt dataset starts afresh.
+    """
+    engine = load_engine()
+    result = engine.rank_songs(np.array(user_indices), np.array(user_distances), threshold, per_user, n_songs)
+    return [engine.dataset.song_titles[i] for i in result.song_indices]
+
+
+def get_personality_recommendations(personality_scores, big5music, n_users=5, threshold=DEFAULT_THRESHOLD,
+                                    per_user=DEFAULT_PER_USER, n_songs=DEFAULT_SONGS):
+    """Get music recommendations based on personality scores
+
+    Each of the n_users nearest users contributes their first per_user songs
+    rated at least threshold; the first n_songs distinct ones are returned,
+    with the nearest user's row of big5music. Profiles are rounded to 2
+    decimals; their nearest users come from this session's distances and
+    the songs from cached_recommendations(). Users ingested
+    since start-up (python -m musipy.ingest) are picked up on the way.
+    """
+    try:
+        engine = load_engine()
+        engine.refresh()
+        if len(big5music) != len(engine.dataset):
+            big5music = engine.users
+        profile = np.round(as_trait_vector(personality_scores), 2)
+        user_indices, user_distances = session_nearest_users(engine, profile, n_users)
+        recommendations = cached_recommendations(engine.version, tuple(user_indices.tolist()),
+                                                 tuple(user_distances.tolist()), threshold, per_user, n_songs)
+        return recommendations, big5music.iloc[user_indices[:1]].assign(distance=user_distances[:1])
+    except Exception as e:
+        st.error(f"Error getting recommendations: {e}")
+        return [], None
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def _sort_keys(scores, largest):
+    # Ascending float keys; NaN ranks last whichever direction is asked for.
+    # Float inputs keep their precision so float32 blocks are not upcast.
+    scores = np.asarray(scores)
+    keys = np.array(scores, dtype=scores.dtype if scores.dtype.kind == 'f' else np.float64)
+    if largest:
+        np.negative(keys, out=keys)
+    nan = np.isnan(keys)
+    if nan.any():
+        keys[nan] = np.inf
+    return keys
+
+
+def top_k(scores, k, largest=False):
+    """Positions of the k smallest (or largest) scores, best first
+
+    Uses argpartition, so the cost is O(n + k log k) rather than a full
+    O(n log n) sort. Ties are broken by position, which gives exactly the
+    order of a stable sort (sort_values(kind='stable'), or sorted() with
+    reverse=True when largest=True).
+
+    A 2-D array is ranked row by row and returns a (rows, k) array.
+    """
+    keys = _sort_keys(scores, largest)
+    squeeze = keys.ndim == 1
+    keys = np.atleast_2d(keys)
+    n = keys.shape[1]
+    k = max(0, min(int(k), n))
+
+    if k == n:
+        chosen = np.argsort(keys, axis=1, kind='stable')
+    elif k == 0:
+        chosen = np.empty((keys.shape[0], 0), dtype=np.intp)
+    else:
+        chosen = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        chosen.sort(axis=1)
+        chosen_keys = np.take_along_axis(keys, chosen, axis=1)
+        order = np.argsort(chosen_keys, axis=1, kind='stable')
+        chosen = np.take_along_axis(chosen, order, axis=1)
+
+        # argpartition picks arbitrarily among values tied with the k-th;
+        # for those rows keep everything below it plus the earliest ties
+        kth = np.take_along_axis(chosen_keys, order[:, -1:], axis=1)
+        tied = (keys == kth).sum(axis=1) != (chosen_keys == kth).sum(axis=1)
+        for row in np.flatnonzero(tied):
+            below = np.flatnonzero(keys[row] < kth[row])
+            ties = np.flatnonzero(keys[row] == kth[row])[:k - below.size]
+            below = below[np.argsort(keys[row, below], kind='stable')]
+            chosen[row] = np.concatenate([below, ties])
+
+    return chosen[0] if squeeze else chosen
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
-from app import app as application
+from app import create_app
+
+application = create_app()
 
 if __name__ == '__main__':
     application.run(port=9000, debug=True)
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from scipy.spatial import distance as ds
-import joblib
 import os
+import sys
+
+# Make the shared musipy engine importable when run as `streamlit run streamlit/...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musipy.streamlit_support import get_personality_recommendations, load_data
 
 # Page configuration
 st.set_page_config(
@@ -44,79 +47,12 @@ if 'recommendations' not in st.session_state:
 if 'personality_scores' not in st.session_state:
     st.session_state.personality_scores = {}
 
-@st.cache_resource
-def load_data():
-    """Load all necessary data files"""
-    try:
-        # Define base directory
-        BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-        
-        # Load model
-        model_path = os.path.join(BASE_DIR, 'models', 'knn.pkl')
-        estimator = joblib.load(model_path)
-        
-        # Load data files
-        song_names_path = os.path.join(BASE_DIR, 'data', 'songs_names.csv')
-        song_cosines_path = os.path.join(BASE_DIR, 'data', 'song_cosines.csv')
-        final_data_path = os.path.join(BASE_DIR, 'data', 'final.csv')
-        
-        song_names = pd.read_csv(song_names_path, encoding='utf-8')
-        song_cosines = pd.read_csv(song_cosines_path)
-        big5music = pd.read_csv(final_data_path)
-        
-        return estimator, song_names, song_cosines, big5music
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None, None, None, None
-
-def get_distances(row, new_row):
-    """Calculate cosine distance between personality scores"""
-    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
-    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
-    return ds.cosine(u, v)
-
-def get_personality_recommendations(personality_scores, big5music):
-    """Get music recommendations based on personality scores"""
-    try:
-        # Calculate distances
-        big5music_copy = big5music.copy()
-        big5music_copy['distance'] = big5music_copy.apply(
-            get_distances, args=(personality_scores,), axis=1
-        )
-        
-        # Sort by distance and get top recommendations
-        big5music_sorted = big5music_copy.sort_values('distance')
-        
-        # Get song columns (exclude personality and metadata columns)
-        song_columns = [col for col in big5music_sorted.columns 
-                       if col not in ['userid', 'ope', 'con', 'ext', 'agr', 'neu', 
-                                     'country_of_residence', 'distance']]
-        
-        # Get top 5 most similar users
-        top_users = big5music_sorted.head(5)
-        
-        # Get their top rated songs
-        recommendations = []
-        for _, user in top_users.iterrows():
-            user_songs = user[song_columns]
-            # Get songs with rating >= 5 (assuming 1-7 scale)
-            top_songs = user_songs[user_songs >= 5].index.tolist()
-            recommendations.extend(top_songs[:3])  # Top 3 songs per user
-        
-        # Remove duplicates and limit to 10 recommendations
-        unique_recommendations = list(dict.fromkeys(recommendations))[:10]
-        
-        return unique_recommendations, big5music_sorted.head(1)
-    except Exception as e:
-        st.error(f"Error getting recommendations: {e}")
-        return [], None
-
 def main():
     # Load data
     with st.spinner("Loading MusiPy..."):
         estimator, song_names, song_cosines, big5music = load_data()
     
-    if estimator is None:
+    if big5music is None:
         st.error("Failed to load application data. Please check your data files.")
         return
     
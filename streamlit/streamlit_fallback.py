@@ -8,9 +8,14 @@ Use this file for Streamlit Cloud deployment.
 import streamlit as st
 import pandas as pd
 import numpy as np
-from scipy.spatial import distance as ds
 import joblib
 import os
+import sys
+
+# Make the shared musipy engine importable when run as `streamlit run streamlit/...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musipy.bfi import BFI_QUESTIONS, trait_scores
+from musipy.store import load_song_cosines, load_song_names, load_users
 
 # Page configuration
 st.set_page_config(
@@ -72,25 +77,6 @@ if 'test_answers' not in st.session_state:
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
 
-# Big Five Inventory (BFI-S) - 15 items
-BFI_QUESTIONS = {
-    0: {"text": "I see myself as someone who is reserved.", "trait": "extraversion", "reverse": True},
-    1: {"text": "I see myself as someone who is generally trusting.", "trait": "agreeableness", "reverse": False},
-    2: {"text": "I see myself as someone who tends to be lazy.", "trait": "conscientiousness", "reverse": True},
-    3: {"text": "I see myself as someone who is relaxed, handles stress well.", "trait": "neuroticism", "reverse": True},
-    4: {"text": "I see myself as someone who has few artistic interests.", "trait": "openness", "reverse": True},
-    5: {"text": "I see myself as someone who is outgoing, sociable.", "trait": "extraversion", "reverse": False},
-    6: {"text": "I see myself as someone who tends to find fault with others.", "trait": "agreeableness", "reverse": True},
-    7: {"text": "I see myself as someone who does a thorough job.", "trait": "conscientiousness", "reverse": False},
-    8: {"text": "I see myself as someone who gets nervous easily.", "trait": "neuroticism", "reverse": False},
-    9: {"text": "I see myself as someone who has an active imagination.", "trait": "openness", "reverse": False},
-    10: {"text": "I see myself as someone who is sometimes shy, inhibited.", "trait": "extraversion", "reverse": True},
-    11: {"text": "I see myself as someone who is helpful and unselfish with others.", "trait": "agreeableness", "reverse": False},
-    12: {"text": "I see myself as someone who can be somewhat careless.", "trait": "conscientiousness", "reverse": True},
-    13: {"text": "I see myself as someone who is calm, emotionally stable.", "trait": "neuroticism", "reverse": True},
-    14: {"text": "I see myself as someone who is curious about many different things.", "trait": "openness", "reverse": False}
-}
-
 # Sample music recommendations for demo purposes
 SAMPLE_RECOMMENDATIONS = [
     "Bohemian Rhapsody - Queen",
@@ -106,36 +92,8 @@ SAMPLE_RECOMMENDATIONS = [
 ]
 
 def calculate_big_five_scores(answers):
-    """Calculate Big Five personality scores from test answers"""
-    trait_scores = {
-        'openness': [],
-        'conscientiousness': [],
-        'extraversion': [],
-        'agreeableness': [],
-        'neuroticism': []
-    }
-    
-    # Collect scores for each trait
-    for question_id, answer in answers.items():
-        question = BFI_QUESTIONS[question_id]
-        trait = question['trait']
-        score = answer
-        
-        # Reverse score if needed
-        if question['reverse']:
-            score = 6 - score  # Convert 1-5 to 5-1
-        
-        trait_scores[trait].append(score)
-    
-    # Calculate averages for each trait
-    final_scores = {}
-    for trait, scores in trait_scores.items():
-        if scores:  # Only calculate if we have scores for this trait
-            final_scores[trait] = round(np.mean(scores), 2)
-        else:
-            final_scores[trait] = 3.0  # Default neutral score
-    
-    return final_scores
+    """Calculate Big Five personality scores from test answers (see musipy.bfi)"""
+    return trait_scores(answers)
 
 def generate_personality_based_recommendations(personality_scores):
     """Generate music recommendations based on personality scores"""
@@ -231,13 +189,13 @@ def load_data():
             estimator = joblib.load(model_path)
         
         if os.path.exists(song_names_path):
-            song_names = pd.read_csv(song_names_path, encoding='utf-8')
+            song_names = load_song_names(song_names_path)
         
         if os.path.exists(song_cosines_path):
-            song_cosines = pd.read_csv(song_cosines_path)
+            song_cosines = load_song_cosines(song_cosines_path)
         
         if os.path.exists(final_data_path):
-            big5music = pd.read_csv(final_data_path)
+            big5music = load_users(final_data_path)
         
         return estimator, song_names, song_cosines, big5music
     
@@ -8,9 +8,13 @@ Use this file for Streamlit Cloud deployment.
 import streamlit as st
 import pandas as pd
 import numpy as np
-from scipy.spatial import distance as ds
-import joblib
 import os
+import sys
+
+# Make the shared musipy engine importable when run as `streamlit run streamlit/...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musipy.bfi import BFI_QUESTIONS, trait_scores
+from musipy.streamlit_support import get_personality_recommendations, load_data
 
 # Page configuration
 st.set_page_config(
@@ -70,56 +74,9 @@ if 'current_question' not in st.session_state:
 if 'test_answers' not in st.session_state:
     st.session_state.test_answers = {}
 
-# Big Five Inventory (BFI-S) - 15 items
-BFI_QUESTIONS = {
-    0: {"text": "I see myself as someone who is reserved.", "trait": "extraversion", "reverse": True},
-    1: {"text": "I see myself as someone who is generally trusting.", "trait": "agreeableness", "reverse": False},
-    2: {"text": "I see myself as someone who tends to be lazy.", "trait": "conscientiousness", "reverse": True},
-    3: {"text": "I see myself as someone who is relaxed, handles stress well.", "trait": "neuroticism", "reverse": True},
-    4: {"text": "I see myself as someone who has few artistic interests.", "trait": "openness", "reverse": True},
-    5: {"text": "I see myself as someone who is outgoing, sociable.", "trait": "extraversion", "reverse": False},
-    6: {"text": "I see myself as someone who tends to find fault with others.", "trait": "agreeableness", "reverse": True},
-    7: {"text": "I see myself as someone who does a thorough job.", "trait": "conscientiousness", "reverse": False},
-    8: {"text": "I see myself as someone who gets nervous easily.", "trait": "neuroticism", "reverse": False},
-    9: {"text": "I see myself as someone who has an active imagination.", "trait": "openness", "reverse": False},
-    10: {"text": "I see myself as someone who is sometimes shy, inhibited.", "trait": "extraversion", "reverse": True},
-    11: {"text": "I see myself as someone who is helpful and unselfish with others.", "trait": "agreeableness", "reverse": False},
-    12: {"text": "I see myself as someone who can be somewhat careless.", "trait": "conscientiousness", "reverse": True},
-    13: {"text": "I see myself as someone who is relaxed, handles stress well.", "trait": "neuroticism", "reverse": True},
-    14: {"text": "I see myself as someone who is curious about many different things.", "trait": "openness", "reverse": False}
-}
-
 def calculate_big_five_scores(answers):
-    """Calculate Big Five personality scores from test answers"""
-    trait_scores = {
-        'openness': [],
-        'conscientiousness': [],
-        'extraversion': [],
-        'agreeableness': [],
-        'neuroticism': []
-    }
-    
-    # Collect scores for each trait
-    for question_id, answer in answers.items():
-        question = BFI_QUESTIONS[question_id]
-        trait = question['trait']
-        score = answer
-        
-        # Reverse score if needed
-        if question['reverse']:
-            score = 6 - score  # Convert 1-5 to 5-1
-        
-        trait_scores[trait].append(score)
-    
-    # Calculate averages for each trait
-    final_scores = {}
-    for trait, scores in trait_scores.items():
-        if scores:  # Only calculate if we have scores for this trait
-            final_scores[trait] = round(np.mean(scores), 2)
-        else:
-            final_scores[trait] = 3.0  # Default neutral score
-    
-    return final_scores
+    """Calculate Big Five personality scores from test answers (see musipy.bfi)"""
+    return trait_scores(answers)
 
 def show_big_five_test():
     """Display the Big Five personality test"""
@@ -316,84 +273,6 @@ def show_external_test():
         st.session_state.show_recommendations = True
         st.rerun()
 
-@st.cache_resource
-def load_data():
-    """Load all necessary data files"""
-    try:
-        # Define base directory
-        BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-        
-        # Load model
-        model_path = os.path.join(BASE_DIR, 'models', 'knn.pkl')
-        if not os.path.exists(model_path):
-            st.error(f"Model file not found: {model_path}")
-            return None, None, None, None
-        estimator = joblib.load(model_path)
-        
-        # Load data files
-        song_names_path = os.path.join(BASE_DIR, 'data', 'songs_names.csv')
-        song_cosines_path = os.path.join(BASE_DIR, 'data', 'song_cosines.csv')
-        final_data_path = os.path.join(BASE_DIR, 'data', 'final.csv')
-        
-        # Check if files exist
-        for path, name in [(song_names_path, 'songs_names.csv'), 
-                          (song_cosines_path, 'song_cosines.csv'), 
-                          (final_data_path, 'final.csv')]:
-            if not os.path.exists(path):
-                st.error(f"Data file not found: {name}")
-                return None, None, None, None
-        
-        song_names = pd.read_csv(song_names_path, encoding='utf-8')
-        song_cosines = pd.read_csv(song_cosines_path)
-        big5music = pd.read_csv(final_data_path)
-        
-        return estimator, song_names, song_cosines, big5music
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None, None, None, None
-
-def get_distances(row, new_row):
-    """Calculate cosine distance between personality scores"""
-    u = [row['ope'], row['agr'], row['neu'], row['con'], row['ext']]
-    v = [new_row['ope'], new_row['agr'], new_row['neu'], new_row['con'], new_row['ext']]
-    return ds.cosine(u, v)
-
-def get_personality_recommendations(personality_scores, big5music):
-    """Get music recommendations based on personality scores"""
-    try:
-        # Calculate distances
-        big5music_copy = big5music.copy()
-        big5music_copy['distance'] = big5music_copy.apply(
-            get_distances, args=(personality_scores,), axis=1
-        )
-        
-        # Sort by distance and get top recommendations
-        big5music_sorted = big5music_copy.sort_values('distance')
-        
-        # Get song columns (exclude personality and metadata columns)
-        song_columns = [col for col in big5music_sorted.columns 
-                       if col not in ['userid', 'ope', 'con', 'ext', 'agr', 'neu', 
-                                     'country_of_residence', 'distance']]
-        
-        # Get top 5 most similar users
-        top_users = big5music_sorted.head(5)
-        
-        # Get their top rated songs
-        recommendations = []
-        for _, user in top_users.iterrows():
-            user_songs = user[song_columns]
-            # Get songs with rating >= 5 (assuming 1-7 scale)
-            top_songs = user_songs[user_songs >= 5].index.tolist()
-            recommendations.extend(top_songs[:3])  # Top 3 songs per user
-        
-        # Remove duplicates and limit to 10 recommendations
-        unique_recommendations = list(dict.fromkeys(recommendations))[:10]
-        
-        return unique_recommendations, big5music_sorted.head(1)
-    except Exception as e:
-        st.error(f"Error getting recommendations: {e}")
-        return [], None
-
 def show_personality_test():
     """Display personality test interface"""
     st.markdown('<div class="personality-section">', unsafe_allow_html=True)
@@ -538,7 +417,7 @@ def main():
         with st.spinner("Loading MusiPy..."):
             estimator, song_names, song_cosines, big5music = load_data()
         
-        if estimator is None:
+        if big5music is None:
             st.error("""
             ❌ **Failed to load application data.** 
             
@@ -0,0 +1,70 @@
+"""Concurrent requests must get the same answers as serial ones
+
+A small run of benchmarks/stress_concurrency.py: a few threads replay
+answers computed one at a time, through the engine and through the JSON
+API and its result cache, and the shared dataset arrays must come out
+unchanged and read-only.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from app import create_app  # noqa: E402
+from benchmarks.stress_concurrency import checksum, replay  # noqa: E402
+
+THREADS = 4
+PROFILES = 20
+
+
+@pytest.fixture(scope='module')
+def app():
+    return create_app()
+
+
+@pytest.fixture(scope='module')
+def profiles():
+    profiles = np.round(np.random.default_rng(0).uniform(1, 5, size=(PROFILES, 5)), 2).tolist()
+    # Each profile twice, so cache hits race with the misses that fill them
+    return profiles + profiles
+
+
+def test_nearest_users_match_serial_answers(app, profiles):
+    engine = app.extensions['musipy']
+
+    def nearest(profile):
+        return lambda: engine.nearest_users(profile, 5)[0].tolist()
+
+    reference = [nearest(profile)() for profile in profiles]
+    assert replay('Engine.nearest_users', THREADS, [nearest(profile) for profile in profiles], reference)
+
+
+def test_personality_api_matches_serial_answers(app, profiles):
+    engine = app.extensions['musipy']
+
+    def personality(profile):
+        client = app.test_client()
+        return lambda: client.post('/api/v1/personality', json={'profiles': [profile]}).get_json()['results']
+
+    reference = [personality(profile)() for profile in profiles]
+    engine.cache.clear()
+    assert replay('/api/v1/personality', THREADS, [personality(profile) for profile in profiles], reference)
+
+
+def test_shared_arrays_unchanged_and_read_only(app, profiles):
+    engine = app.extensions['musipy']
+    dataset = engine.dataset
+    before = checksum(dataset)
+
+    def recommend(profile):
+        return lambda: engine.recommend(profile).song_indices.tolist()
+
+    reference = [recommend(profile)() for profile in profiles]
+    engine.cache.clear()
+    assert replay('Engine.recommend', THREADS, [recommend(profile) for profile in profiles], reference)
+    assert checksum(dataset) == before
+    with pytest.raises(ValueError):
+        dataset.traits[0, 0] = 0
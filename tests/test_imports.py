@@ -0,0 +1,29 @@
+"""The serving path must not import the heavy packages only the offline tools need
+
+Each target is imported in a fresh interpreter, as a gunicorn master
+would, and its sys.modules is checked. See benchmarks/bench_imports.py for
+the timing report and the list of packages.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from benchmarks.bench_imports import HEAVY_PACKAGES, TARGETS  # noqa: E402
+
+
+def imported_packages(target):
+    """Top-level packages in sys.modules after importing target in a fresh interpreter"""
+    code = f"import json, sys, {target}; print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+@pytest.mark.parametrize('target', TARGETS)
+def test_serving_path_skips_heavy_packages(target):
+    heavy = sorted(set(HEAVY_PACKAGES) & imported_packages(target))
+    assert not heavy, f"import {target} loads {', '.join(heavy)}"
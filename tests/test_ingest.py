@@ -0,0 +1,85 @@
+"""musipy.ingest round trip on a copy of the data
+
+New users appended to a fresh store must read back as they were sent,
+blank and 0 ratings as unrated, and become searchable, while the CSVs stay
+as published.
+"""
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from musipy.dataset import load_dataset  # noqa: E402
+from musipy.distance import TRAIT_COLUMNS  # noqa: E402
+from musipy.ingest import ingest_users  # noqa: E402
+from musipy.paths import DATA_DIR, file_digest  # noqa: E402
+from musipy.store import build_store, load_users  # noqa: E402
+
+CSV_FILES = ['final.csv', 'song_cosines.csv', 'songs_names.csv']
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for name in CSV_FILES:
+        shutil.copy(os.path.join(DATA_DIR, name), tmp_path)
+    build_store(str(tmp_path))
+    return str(tmp_path)
+
+
+def new_users(data_dir, n=3):
+    frame = load_users(os.path.join(data_dir, 'final.csv')).iloc[:n].copy()
+    frame['userid'] = [f'ingested{i}' for i in range(n)]
+    frame[TRAIT_COLUMNS] = np.round(np.random.default_rng(0).uniform(1, 5, size=(n, len(TRAIT_COLUMNS))), 2)
+    return frame
+
+
+def test_ingested_users_read_back(data_dir):
+    digests = {name: file_digest(os.path.join(data_dir, name)) for name in CSV_FILES}
+    before = load_dataset(data_dir)
+    frame = new_users(data_dir)
+    song = frame.columns[-1]
+    frame[song] = frame[song].astype(float)
+    frame.loc[frame.index[0], song] = np.nan
+    frame.loc[frame.index[1], song] = 0
+
+    result = ingest_users(frame, data_dir)
+    after = load_dataset(data_dir)
+
+    assert (result.rows, result.users, result.generation) == (3, len(before) + 3, 1)
+    assert len(after) == len(before) + 3 and after.generation == 1
+    assert after.version != before.version
+    assert after.userids[-3:].tolist() == [b'ingested0', b'ingested1', b'ingested2']
+    np.testing.assert_array_equal(after.traits[-3:], frame[TRAIT_COLUMNS].to_numpy())
+    column = after.song_titles.index(song)
+    ratings = frame[after.song_titles].fillna(0).to_numpy()
+    np.testing.assert_array_equal(after.ratings[-3:], ratings)
+    assert (after.rated(np.arange(len(after) - 3, len(after))) == (ratings != 0)).all()
+    assert not after.rated([len(after) - 3, len(after) - 2])[:, column].any()
+    np.testing.assert_array_equal(after.traits[:len(before)], before.traits)
+
+    # Each new user is the nearest user to their own traits
+    for row, traits in enumerate(frame[TRAIT_COLUMNS].to_numpy(), start=len(before)):
+        distances = 1 - after.unit_traits @ (traits / np.linalg.norm(traits))
+        assert np.argmin(distances) == row
+
+    assert {name: file_digest(os.path.join(data_dir, name)) for name in CSV_FILES} == digests
+
+
+def test_rejected_batches_change_nothing(data_dir):
+    ingest_users(new_users(data_dir), data_dir)
+    version = load_dataset(data_dir).version
+
+    with pytest.raises(ValueError, match='already stored'):
+        ingest_users(new_users(data_dir), data_dir)
+    bad = new_users(data_dir)
+    bad['userid'] = ['other0', 'other1', 'other2']
+    bad[bad.columns[-1]] = bad[bad.columns[-1]].astype(object)
+    bad.loc[bad.index[0], bad.columns[-1]] = 'x'
+    with pytest.raises(ValueError, match='whole numbers'):
+        ingest_users(bad, data_dir)
+
+    assert load_dataset(data_dir).version == version
@@ -0,0 +1,63 @@
+"""musipy.knn.KNNModel must predict what scikit-learn's KNeighborsRegressor does
+
+On a small fixed sample, for both weightings, through from_estimator() and a
+save()/load() round trip. Queries with training rows tied at the k-th
+neighbour distance are left out: which tied row makes the cut is arbitrary
+in scikit-learn too.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from musipy.knn import KNNModel  # noqa: E402
+
+neighbors = pytest.importorskip('sklearn.neighbors')
+
+N_NEIGHBORS = 15
+
+
+@pytest.fixture(scope='module')
+def sample():
+    rng = np.random.default_rng(0)
+    X = np.round(rng.uniform(1, 5, size=(300, 5)), 2)
+    y = rng.integers(0, 10, size=(300, 50))
+    # Random profiles, plus training rows, which are exact matches
+    queries = np.vstack([np.round(rng.uniform(1, 5, size=(40, 5)), 2), X[:10]])
+    return X, y, queries
+
+
+def untied(model, queries):
+    distances, _ = model.kneighbors(queries, model.n_neighbors + 1)
+    return distances[:, -1] != distances[:, -2]
+
+
+@pytest.mark.parametrize('weights', ['uniform', 'distance'])
+def test_predictions_match_sklearn(sample, weights, tmp_path):
+    X, y, queries = sample
+    estimator = neighbors.KNeighborsRegressor(n_neighbors=N_NEIGHBORS, weights=weights).fit(X, y)
+    model = KNNModel.from_estimator(estimator)
+    model.save(str(tmp_path / 'knn.bin'))
+    loaded = KNNModel.load(str(tmp_path / 'knn.bin'))
+
+    keep = untied(model, queries)
+    assert keep.sum() >= len(queries) - 5
+    expected = estimator.predict(queries[keep])
+    np.testing.assert_allclose(model.predict(queries[keep]), expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(loaded.predict(queries[keep]), expected, rtol=0, atol=1e-9)
+
+
+def test_neighbours_match_sklearn(sample):
+    X, y, queries = sample
+    estimator = neighbors.KNeighborsRegressor(n_neighbors=N_NEIGHBORS).fit(X, y)
+    model = KNNModel.from_estimator(estimator)
+
+    keep = untied(model, queries)
+    expected_distances, expected_indices = estimator.kneighbors(queries[keep])
+    distances, indices = model.kneighbors(queries[keep])
+    np.testing.assert_allclose(distances, expected_distances, rtol=0, atol=1e-9)
+    # Equal distances inside the k may come in either order
+    assert (np.sort(indices, axis=1) == np.sort(expected_indices, axis=1)).all()
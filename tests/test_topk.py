@@ -0,0 +1,48 @@
+"""musipy.topk.top_k ranks like a stable sort: ties by position, NaN last"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from musipy.topk import top_k  # noqa: E402
+
+
+def stable_order(scores, largest):
+    # sort_values(kind='stable') order, with NaN last in either direction
+    scores = np.asarray(scores, dtype=np.float64)
+    keys = -scores if largest else scores
+    return np.argsort(np.where(np.isnan(keys), np.inf, keys), kind='stable')
+
+
+@pytest.mark.parametrize('largest', [False, True])
+@pytest.mark.parametrize('k', [0, 1, 3, 7, 10, 12])
+def test_ties_keep_position_order(largest, k):
+    scores = np.array([3, 1, 2, 1, 3, 2, 1, 3, 2, 1], dtype=np.float64)
+    assert top_k(scores, k, largest).tolist() == stable_order(scores, largest)[:k].tolist()
+
+
+@pytest.mark.parametrize('largest', [False, True])
+def test_nan_ranks_last(largest):
+    scores = np.array([np.nan, 2.0, np.nan, 1.0, 2.0])
+    assert top_k(scores, 5, largest).tolist() == stable_order(scores, largest).tolist()
+    assert top_k(scores, 3, largest).tolist() == stable_order(scores, largest)[:3].tolist()
+    assert set(top_k(scores, 3, largest)) == {1, 3, 4}
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64, np.int64, np.uint8])
+@pytest.mark.parametrize('largest', [False, True])
+def test_rows_match_stable_sort(dtype, largest):
+    rng = np.random.default_rng(0)
+    # Few distinct values, so most rows have ties at the k-th score
+    scores = rng.integers(0, 5, size=(50, 40)).astype(dtype)
+    expected = np.stack([stable_order(row, largest)[:6] for row in scores])
+    assert (top_k(scores, 6, largest) == expected).all()
+
+
+def test_float32_ties_are_not_broken_by_upcasting():
+    # Distinct as float64, equal as float32
+    scores = np.array([1.00000001, 1.0, 0.5], dtype=np.float32)
+    assert top_k(scores, 2).tolist() == [2, 0]